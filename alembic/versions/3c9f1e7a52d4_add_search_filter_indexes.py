@@ -0,0 +1,46 @@
+"""add search filter indexes
+
+Revision ID: 3c9f1e7a52d4
+Revises: 8926c928bb1e
+Create Date: 2026-10-18 12:20:41.315207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9f1e7a52d4'
+down_revision: Union[str, None] = '8926c928bb1e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # base_filter поиска: lower(geo) = $1 AND lower(category) IN ($2, 'все')
+    op.create_index(
+        'idx_celebrities_geo_category_lower',
+        'celebrities',
+        [sa.text('lower(geo)'), sa.text('lower(category)')],
+    )
+    # update_celebrity: lower(name) = .. AND lower(geo) = .. AND lower(category) = ..
+    op.create_index(
+        'idx_celebrities_name_geo_category_lower',
+        'celebrities',
+        [sa.text('lower(name)'), sa.text('lower(geo)'), sa.text('lower(category)')],
+    )
+    # get_celebrities: согласованные селебы по гео/категории
+    op.create_index(
+        'idx_celebrities_approved_geo_category',
+        'celebrities',
+        [sa.text('lower(geo)'), sa.text('lower(category)'), 'name'],
+        postgresql_where=sa.text("status = 'согласована'"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_celebrities_approved_geo_category', table_name='celebrities')
+    op.drop_index('idx_celebrities_name_geo_category_lower', table_name='celebrities')
+    op.drop_index('idx_celebrities_geo_category_lower', table_name='celebrities')
@@ -0,0 +1,88 @@
+"""coalesce pending requests
+
+Revision ID: 7d2e5b8f4a61
+Revises: e4b7a1c90f23
+Create Date: 2026-10-18 13:05:27.184630
+
+"""
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from transliterate import translit
+import unidecode
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2e5b8f4a61'
+down_revision: Union[str, None] = 'e4b7a1c90f23'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # нормализованные имена для поиска одинаковых заявок (sanitize_cyr / sanitize_ascii)
+    op.add_column('pending_requests', sa.Column('normalized_name', sa.Text(), nullable=True))
+    op.add_column('pending_requests', sa.Column('ascii_name', sa.Text(), nullable=True))
+    _backfill_names()
+    op.create_index(
+        'idx_pending_requests_category_geo_lower',
+        'pending_requests',
+        [sa.text('lower(category)'), sa.text('lower(geo)')],
+    )
+
+    # остальные юзеры, ожидающие ответа по той же заявке
+    op.create_table(
+        'pending_request_requesters',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('request_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('message_id', sa.Integer(), nullable=False),
+        sa.Column('bot_message_id', sa.Integer(), nullable=True),
+        sa.Column('username', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['request_id'], ['pending_requests.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('idx_pending_request_requesters_request_id', 'pending_request_requesters', ['request_id'])
+
+
+# замороженные копии utils.sanitize_cyr / utils.sanitize_ascii на момент миграции:
+# utils тянет конфиг бота, а его дальнейшие правки не должны менять эту ревизию
+def _sanitize_cyr(text: str) -> str:
+    if re.search(r'[a-z]', text, re.I):
+        try:
+            text = translit(text, 'ru')
+        except Exception:
+            pass
+    text = re.sub(r"[^\w\s]", "", text, flags=re.UNICODE)
+    return text.strip().lower()
+
+
+def _sanitize_ascii(text: str) -> str:
+    if re.fullmatch(r'[A-Za-z0-9\s]+', text):
+        return text.strip().lower()
+    return re.sub(r"[^\w\s]", "", unidecode.unidecode(text), flags=re.UNICODE).strip().lower()
+
+
+def _backfill_names() -> None:
+    # нормализация на питоне (transliterate/unidecode), в SQL её не повторить;
+    # иначе старые заявки никогда не склеятся с новыми
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, celebrity_name FROM pending_requests")).fetchall()
+    if not rows:
+        return
+    bind.execute(
+        sa.text("UPDATE pending_requests SET normalized_name = :cyr, ascii_name = :asc WHERE id = :id"),
+        [{"id": row.id, "cyr": _sanitize_cyr(row.celebrity_name), "asc": _sanitize_ascii(row.celebrity_name)}
+         for row in rows],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('idx_pending_request_requesters_request_id', table_name='pending_request_requesters')
+    op.drop_table('pending_request_requesters')
+    op.drop_index('idx_pending_requests_category_geo_lower', table_name='pending_requests')
+    op.drop_column('pending_requests', 'ascii_name')
+    op.drop_column('pending_requests', 'normalized_name')
@@ -0,0 +1,76 @@
+"""notify celebrities and subscribers changes
+
+Revision ID: 9b4e0d7c3f18
+Revises: f3a8c2e61d07
+Create Date: 2026-10-18 17:05:12.118304
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4e0d7c3f18'
+down_revision: Union[str, None] = 'f3a8c2e61d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # канал db_changes: короткое событие на каждую изменённую строку,
+    # сами данные слушатель при необходимости дочитывает по id
+    op.execute("""
+        CREATE FUNCTION notify_celebrities_change() RETURNS trigger AS $$
+        DECLARE
+            r celebrities;
+            payload jsonb;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN r := OLD; ELSE r := NEW; END IF;
+            payload := jsonb_build_object(
+                'table', TG_TABLE_NAME, 'op', TG_OP, 'id', r.id,
+                'geo', r.geo, 'category', r.category
+            );
+            IF TG_OP = 'UPDATE' AND (OLD.geo, OLD.category) IS DISTINCT FROM (NEW.geo, NEW.category) THEN
+                payload := payload || jsonb_build_object('old_geo', OLD.geo, 'old_category', OLD.category);
+            END IF;
+            PERFORM pg_notify('db_changes', payload::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER celebrities_notify
+        AFTER INSERT OR UPDATE OR DELETE ON celebrities
+        FOR EACH ROW EXECUTE FUNCTION notify_celebrities_change()
+    """)
+    op.execute("""
+        CREATE FUNCTION notify_subscribers_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM pg_notify('db_changes', jsonb_build_object(
+                    'table', TG_TABLE_NAME, 'op', TG_OP, 'chat_id', OLD.chat_id
+                )::text);
+            ELSE
+                PERFORM pg_notify('db_changes', jsonb_build_object(
+                    'table', TG_TABLE_NAME, 'op', TG_OP, 'chat_id', NEW.chat_id, 'role', NEW.role
+                )::text);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # смена username роли не меняет — такие апдейты не шлём
+    op.execute("""
+        CREATE TRIGGER subscribers_notify
+        AFTER INSERT OR DELETE OR UPDATE OF role ON subscribers
+        FOR EACH ROW EXECUTE FUNCTION notify_subscribers_change()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS subscribers_notify ON subscribers")
+    op.execute("DROP FUNCTION IF EXISTS notify_subscribers_change()")
+    op.execute("DROP TRIGGER IF EXISTS celebrities_notify ON celebrities")
+    op.execute("DROP FUNCTION IF EXISTS notify_celebrities_change()")
@@ -0,0 +1,27 @@
+"""add pending_requests created_at index
+
+Revision ID: a5c3d9e2b710
+Revises: 7d2e5b8f4a61
+Create Date: 2026-10-18 13:41:52.906417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a5c3d9e2b710'
+down_revision: Union[str, None] = '7d2e5b8f4a61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # keyset-пагинация /requests: ORDER BY created_at, id
+    op.create_index('idx_pending_requests_created_at_id', 'pending_requests', ['created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('idx_pending_requests_created_at_id', table_name='pending_requests')
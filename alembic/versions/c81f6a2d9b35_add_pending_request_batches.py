@@ -0,0 +1,37 @@
+"""add pending request batches
+
+Revision ID: c81f6a2d9b35
+Revises: a5c3d9e2b710
+Create Date: 2026-10-18 14:02:16.470385
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f6a2d9b35'
+down_revision: Union[str, None] = 'a5c3d9e2b710'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # заявки из одного массового поиска: одно сообщение модераторам на всю пачку
+    op.add_column('pending_requests', sa.Column('batch_id', sa.Integer(), nullable=True))
+    op.create_index('idx_pending_requests_batch_id', 'pending_requests', ['batch_id'])
+
+    op.add_column('pending_messages', sa.Column('batch_id', sa.Integer(), nullable=True))
+    op.add_column(
+        'pending_messages',
+        sa.Column('with_actions', sa.Boolean(), server_default=sa.text('true'), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('pending_messages', 'with_actions')
+    op.drop_column('pending_messages', 'batch_id')
+    op.drop_index('idx_pending_requests_batch_id', table_name='pending_requests')
+    op.drop_column('pending_requests', 'batch_id')
@@ -0,0 +1,34 @@
+"""add pending_messages table
+
+Revision ID: e4b7a1c90f23
+Revises: 3c9f1e7a52d4
+Create Date: 2026-10-18 12:48:03.551904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7a1c90f23'
+down_revision: Union[str, None] = '3c9f1e7a52d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # копии заявки у модераторов/наблюдателей; удаляются вместе с заявкой
+    op.create_table(
+        'pending_messages',
+        sa.Column('request_id', sa.Integer(), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('message_id', sa.BigInteger(), nullable=False),
+        sa.ForeignKeyConstraint(['request_id'], ['pending_requests.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('request_id', 'chat_id', 'message_id'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('pending_messages')
@@ -0,0 +1,83 @@
+"""track celebrity changes for sheets sync
+
+Revision ID: f3a8c2e61d07
+Revises: c81f6a2d9b35
+Create Date: 2026-10-18 16:21:48.903117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a8c2e61d07'
+down_revision: Union[str, None] = 'c81f6a2d9b35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # время последнего изменения строки — по нему выгружаются только изменения
+    op.add_column(
+        'celebrities',
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('idx_celebrities_updated_at', 'celebrities', ['updated_at'])
+
+    # удалённые id, ещё не удалённые из таблицы
+    op.create_table(
+        'celebrity_deletions',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('deleted_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+    op.create_index('idx_celebrity_deletions_deleted_at', 'celebrity_deletions', ['deleted_at'])
+
+    # момент начала последней успешной синхронизации
+    op.create_table(
+        'sync_watermarks',
+        sa.Column('name', sa.Text(), primary_key=True),
+        sa.Column('synced_at', sa.TIMESTAMP(timezone=True), nullable=False),
+    )
+
+    # триггеры, чтобы изменения ловились при любом способе записи (бот, вебхук, ручной SQL)
+    op.execute("""
+        CREATE FUNCTION celebrities_touch() RETURNS trigger AS $$
+        BEGIN
+            NEW.updated_at := now();
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER celebrities_touch
+        BEFORE UPDATE ON celebrities
+        FOR EACH ROW EXECUTE FUNCTION celebrities_touch()
+    """)
+    op.execute("""
+        CREATE FUNCTION celebrities_log_delete() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO celebrity_deletions (id) VALUES (OLD.id)
+            ON CONFLICT (id) DO UPDATE SET deleted_at = now();
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER celebrities_log_delete
+        AFTER DELETE ON celebrities
+        FOR EACH ROW EXECUTE FUNCTION celebrities_log_delete()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS celebrities_log_delete ON celebrities")
+    op.execute("DROP FUNCTION IF EXISTS celebrities_log_delete()")
+    op.execute("DROP TRIGGER IF EXISTS celebrities_touch ON celebrities")
+    op.execute("DROP FUNCTION IF EXISTS celebrities_touch()")
+    op.drop_table('sync_watermarks')
+    op.drop_index('idx_celebrity_deletions_deleted_at', table_name='celebrity_deletions')
+    op.drop_table('celebrity_deletions')
+    op.drop_index('idx_celebrities_updated_at', table_name='celebrities')
+    op.drop_column('celebrities', 'updated_at')
@@ -8,7 +8,8 @@ from flask import Flask, request, abort, jsonify
 from config import logger
 from db.database_manager import DatabaseManager
 from db.celebrity_service import CelebrityService
-from sheets_client import push_row, push_rows
+from db.search_cache import SearchCache
+from sheets_client import push_row, push_rows, invalidate_row_index
 
 import socket
 import urllib.request
@@ -22,7 +23,17 @@ asyncio.set_event_loop(loop)
 
 loop.run_until_complete(DatabaseManager.init())
 pool = loop.run_until_complete(DatabaseManager.get_pool())
-service = CelebrityService(pool)
+# без кэша поиска и без индекса: цикл крутится только внутри запросов, уведомления
+# об изменениях от бота читались бы с опозданием и find_celebrity отвечал бы из устаревшего кэша
+service = CelebrityService(pool, cache=SearchCache(maxsize=0))
+
+
+def get_sheet_row(row: dict) -> int | None:
+    sheet_row = row.get("_row")
+    try:
+        return int(sheet_row) if sheet_row is not None else None
+    except (TypeError, ValueError):
+        return None
 
 
 def process_single_row(row: dict, skip_push=False):
@@ -34,16 +45,14 @@ def process_single_row(row: dict, skip_push=False):
     except (TypeError, ValueError):
         rec_id = None
 
-    sheet_row = row.get("_row")
-    try:
-        sheet_row = int(sheet_row) if sheet_row is not None else None
-    except (TypeError, ValueError):
-        sheet_row = None
+    sheet_row = get_sheet_row(row)
 
     if action == "delete":
         if not rec_id:
             raise ValueError("Missing id for delete")
         loop.run_until_complete(service.delete_by_id(rec_id))
+        # строку удалили в таблице руками — строки ниже сдвинулись
+        invalidate_row_index()
         return {"deleted": rec_id}
 
     name_orig = row.get("name", "").strip()
@@ -91,8 +100,6 @@ def process_single_row(row: dict, skip_push=False):
                     reason=reason
                 )
             )
-
-        updated["_row"] = sheet_row
     except UniqueViolationError as e:
         logger.warning(f"Duplicate entry skipped: {e}")
         updated = loop.run_until_complete(service.find_celebrity(name, category, geo))
@@ -112,15 +119,19 @@ def sheet_webhook():
 
         if "rows" in data:
             results = []
+            sheet_rows = {}
             for row in data["rows"]:
                 try:
                     res = process_single_row(row, skip_push=True)
                     if res:
                         results.append(res)
+                        sheet_row = get_sheet_row(row)
+                        if sheet_row:
+                            sheet_rows[res["id"]] = sheet_row
                 except Exception as e:
                     logger.error("Error in row:\n" + traceback.format_exc())
             if results:
-                push_rows(results)
+                push_rows(results, sheet_rows)
             return jsonify({"ok": True, "updated": len(results)})
 
         result = process_single_row(data)
@@ -6,16 +6,17 @@ import config
 from aiogram import Bot, Dispatcher, F
 from aiogram.filters import Command, StateFilter
 
-from db.celebrity_service import CelebrityService
 from db.database_manager import DatabaseManager
-from db.requests_service import RequestsService
 from db.service_middleware import ServiceMiddleware
-from db.subscribers_service import SubscribersService
 from filters import AdminModObserverFilter
+from rate_limiter import LIMITER, RateLimitMiddleware
+from sheets_queue import SHEETS_QUEUE
 from handlers.moderator_handlers import edit_handler, field_chosen, edit_back_button_handler, \
     new_param_chosen, delete_celebrity_handler, delete_request_handler, cmd_requests, cmd_users, cmd_role, \
     cancel_role_handler, cmd_role_receive_user_id, resume_role_changing_handler, role_chosen_handler, \
-    name_or_reason_edited, process_reason, handle_request_moderator, upload_confirmed, upload_cancelled, cmd_upload
+    name_or_reason_edited, process_reason, handle_request_moderator, upload_confirmed, upload_cancelled, cmd_upload, \
+    bulk_open_handler, bulk_selection_handler, bulk_reason_handler, requests_page_handler, batch_item_handler, \
+    cmd_reconcile, reconcile_handler
 from handlers.user_handlers import (
     cmd_search, cmd_start,
     mode_chosen,
@@ -25,19 +26,29 @@ from handlers.user_handlers import (
     SearchMenu,
     manual_handler, back_handler, new_search_handler, available_celebs_handler, cmd_approved, cancel_handler,
     approved_geo_chosen_handler, back_to_approved_handler, approved_cat_chosen_handler, similar_celebs_handler,
+    celebs_page_handler,
 )
-from states import EditCelebrity, EditUserRole, ModeratingStates, Upload
+from states import EditCelebrity, EditUserRole, ModeratingStates, Upload, BulkModeration
 from command_manager import CommandManager
 
 
 def create_on_startup(dp: Dispatcher, bot: Bot):
     async def on_startup():
-        pool = dp['pool']
-        dp['celebrity_service'] = CelebrityService(pool)
-        dp['requests_service'] = RequestsService(pool)
-        dp['subscribers_service'] = SubscribersService(pool)
+        middleware = dp['service_middleware']
+        dp['celebrity_service'] = middleware.celebrity_service
+        dp['requests_service'] = middleware.requests_service
+        dp['subscribers_service'] = middleware.subscribers_service
         command_manager = CommandManager()
 
+        # слушаем изменения до загрузки, чтобы не пропустить записи между загрузкой и подпиской
+        DatabaseManager.subscribe("celebrities", dp['celebrity_service'].apply_change)
+        DatabaseManager.subscribe("subscribers", dp['subscribers_service'].apply_change)
+        DatabaseManager.subscribe("celebrities", SHEETS_QUEUE.apply_change)
+        await DatabaseManager.start_listener()
+
+        await dp['celebrity_service'].load_index()
+        await dp['subscribers_service'].load_roles()
+
         moderators = await dp['subscribers_service'].get_moderators()
         observers = await dp['subscribers_service'].get_observers()
         extra_users = moderators + observers
@@ -52,22 +63,36 @@ def create_on_startup(dp: Dispatcher, bot: Bot):
         await command_manager.set_admin_commands(bot)
         await command_manager.set_global_commands(bot)
 
+        LIMITER.spawn(LIMITER.log_metrics())
+        # записи в гугл таблицу уходят в фоне, в том числе оставшиеся с прошлого запуска
+        LIMITER.spawn(SHEETS_QUEUE.run())
+
     return on_startup
 
 async def on_shutdown():
+    try:
+        await SHEETS_QUEUE.flush()
+    except Exception as e:
+        # не отправленное останется в файле очереди до следующего запуска
+        config.logger.error("Failed to flush sheet writes on shutdown", exc_info=e)
+    SHEETS_QUEUE.close()
     await DatabaseManager.close()
 
 
 async def main():
     bot = Bot(token=config.BOT_TOKEN)
+    # все исходящие запросы идут через общий планировщик с лимитами и приоритетами
+    bot.session.middleware(RateLimitMiddleware(LIMITER))
     dp = Dispatcher(storage=MemoryStorage())
 
     await DatabaseManager.init()
     pool = await DatabaseManager.get_pool()
-    dp.update.middleware(ServiceMiddleware(pool))
+    service_middleware = ServiceMiddleware(pool)
+    dp.update.middleware(service_middleware)
     dp['pool'] = pool
-    subscribers_service = SubscribersService(pool)
-    admin_mod_observer_filter = AdminModObserverFilter(subscribers_service)
+    dp['service_middleware'] = service_middleware
+    # фильтр использует тот же сервис, что и хендлеры, чтобы делить кэш ролей
+    admin_mod_observer_filter = AdminModObserverFilter(service_middleware.subscribers_service)
 
     dp.message.register(cmd_start, Command("start"))
     dp.message.register(cmd_search, Command("search"))
@@ -80,6 +105,8 @@ async def main():
     dp.message.register(cmd_upload, Command("upload"), F.from_user.id == config.ADMIN_ID)
     dp.message.register(lambda message: message.answer(f"❌ У вас нет прав для этой команды."), Command("role"))
     dp.message.register(lambda message: message.answer(f"❌ У вас нет прав для этой команды."), Command("upload"))
+    dp.message.register(cmd_reconcile, Command("reconcile"), F.from_user.id == config.ADMIN_ID)
+    dp.message.register(lambda message: message.answer(f"❌ У вас нет прав для этой команды."), Command("reconcile"))
 
     dp.callback_query.register(cancel_role_handler, F.data == "cancel_role_change")
     dp.callback_query.register(resume_role_changing_handler, F.data == "resume_role_changing")
@@ -94,8 +121,10 @@ async def main():
     dp.callback_query.register(geo_chosen, F.data.startswith("geo:"), StateFilter(SearchMenu.choosing_geo))
     dp.callback_query.register(cat_chosen, F.data.startswith("cat:"), StateFilter(SearchMenu.choosing_cat))
     dp.callback_query.register(available_celebs_handler, F.data == "available_celebs")
+    dp.callback_query.register(celebs_page_handler, F.data.startswith("celebs_page:"))
 
     dp.message.register(process_reason, StateFilter(ModeratingStates.awaiting_reason))
+    dp.message.register(bulk_reason_handler, StateFilter(BulkModeration.awaiting_reason))
     dp.callback_query.register(back_to_approved_handler, F.data == "back:approved", StateFilter(SearchMenu.choosing_cat))
     dp.callback_query.register(back_handler,F.data.startswith("back:"))
     dp.callback_query.register(new_search_handler,F.data == "new_search")
@@ -110,14 +139,19 @@ async def main():
 
     dp.callback_query(F.data.startswith("approve:"))(handle_request_moderator)
     dp.callback_query(F.data.startswith("ban:"))(handle_request_moderator)
+    dp.callback_query.register(batch_item_handler, F.data.startswith("bq:"))
 
     dp.callback_query.register(approved_geo_chosen_handler, F.data.startswith("geo_approved"), StateFilter(SearchMenu.choosing_geo))
     dp.callback_query.register(approved_cat_chosen_handler, F.data.startswith("cat_approved"))
     dp.callback_query.register(cancel_handler, F.data == "cancel")
 
     dp.callback_query.register(delete_request_handler, F.data.startswith("delete:"))
-    dp.callback_query.register(upload_confirmed, F.data == "confirm_upload")
+    dp.callback_query.register(requests_page_handler, F.data.startswith("rq:"))
+    dp.callback_query.register(bulk_open_handler, F.data == "bulk:open")
+    dp.callback_query.register(bulk_selection_handler, F.data.startswith("bulk:"), StateFilter(BulkModeration.selecting))
+    dp.callback_query.register(upload_confirmed, F.data.in_({"confirm_upload", "confirm_upload:full"}))
     dp.callback_query.register(upload_cancelled, F.data == "cancel_upload")
+    dp.callback_query.register(reconcile_handler, F.data.startswith("reconcile:"), F.from_user.id == config.ADMIN_ID)
 
 
     dp.startup.register(create_on_startup(dp, bot))
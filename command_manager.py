@@ -13,7 +13,8 @@ class CommandManager:
             types.BotCommand(command="requests", description="Посмотреть активные заявки "),
             types.BotCommand(command="users", description="Посмотреть кто подписан на бота"),
             types.BotCommand(command="role", description="Редактирование роли юзера"),
-            types.BotCommand(command="upload", description="Выгрузить из бд в таблицу")
+            types.BotCommand(command="upload", description="Выгрузить из бд в таблицу"),
+            types.BotCommand(command="reconcile", description="Сверить таблицу с бд")
         ]
 
         self.mod_observer = self.common + [
@@ -15,4 +15,17 @@ load_dotenv()
 BOT_TOKEN           = os.getenv("BOT_TOKEN")
 DATABASE_URL        = os.getenv("DATABASE_URL")
 ADMIN_ID        = int(os.getenv("ADMIN_ID"))
-FUZY_THRESHOLD      = int(os.getenv("FUZY_THRESHOLD", 80))
\ No newline at end of file
+FUZY_THRESHOLD      = int(os.getenv("FUZY_THRESHOLD", 80))
+SEARCH_CACHE_SIZE   = int(os.getenv("SEARCH_CACHE_SIZE", 2048))
+SEARCH_CACHE_TTL    = int(os.getenv("SEARCH_CACHE_TTL", 600))
+
+DB_CONNECTION_PER_UPDATE = os.getenv("DB_CONNECTION_PER_UPDATE", "false").lower() == "true"
+
+# postgres - общий для всех процессов бота, local - в памяти процесса
+PENDING_MESSAGES_STORE = os.getenv("PENDING_MESSAGES_STORE", "postgres").lower()
+
+REQUESTS_PAGE_SIZE = int(os.getenv("REQUESTS_PAGE_SIZE", 10))
+
+# локальная очередь записей в гугл таблицу, переживает рестарт бота
+SHEETS_QUEUE_PATH = os.getenv("SHEETS_QUEUE_PATH", "sheets_queue.sqlite3")
+SHEETS_FLUSH_DELAY = float(os.getenv("SHEETS_FLUSH_DELAY", 2))
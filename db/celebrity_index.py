@@ -0,0 +1,180 @@
+from typing import Dict, Any, Union, List
+
+from rapidfuzz import fuzz
+
+import config
+from db.connection import acquire
+from db.statements import STATEMENTS
+from utils import sanitize_cyr, sanitize_ascii
+
+
+UNIVERSAL_CATEGORY = 'все'
+APPROVED_STATUS = 'согласована'
+RESULT_LIMIT = 5
+
+LOAD_ALL = STATEMENTS.register("celebrities.index_load", """
+    SELECT id, name, normalized_name, ascii_name, category, geo, status, reason
+      FROM celebrities
+     ORDER BY id
+""")
+
+LOAD_ONE = STATEMENTS.register("celebrities.index_load_one", """
+    SELECT id, name, normalized_name, ascii_name, category, geo, status, reason
+      FROM celebrities
+     WHERE id = $1
+""")
+
+
+class CelebrityIndex:
+    """
+    In-process index of celebrities, grouped by (geo, category).
+    Postgres remains the source of truth: the index is loaded once at startup
+    and kept in sync by CelebrityService write paths.
+    """
+
+    def __init__(self, min_similarity: int = config.FUZY_THRESHOLD):
+        self.min_similarity = min_similarity
+        self.loaded = False
+        self._by_id: dict[int, dict] = {}
+        self._by_key: dict[tuple[str, str], dict[int, dict]] = {}
+
+    async def load(self, pool) -> int:
+        async with acquire(pool) as conn:
+            rows = await STATEMENTS.fetch(conn, LOAD_ALL)
+        self._by_id.clear()
+        self._by_key.clear()
+        for row in rows:
+            self._add(dict(row))
+        self.loaded = True
+        config.logger.info(f"Celebrity index loaded: {len(rows)} rows")
+        return len(rows)
+
+    async def refresh(self, pool, rec_id: int):
+        """
+        Re-reads one row, e.g. after another process changed it.
+        """
+        async with acquire(pool) as conn:
+            row = await STATEMENTS.fetchrow(conn, LOAD_ONE, rec_id)
+        if row is None:
+            self.remove(rec_id)
+        else:
+            row = dict(row)
+            self.upsert(row, row["normalized_name"] or "", row["ascii_name"] or "")
+
+    @staticmethod
+    def _key(geo: str | None, category: str | None) -> tuple[str, str]:
+        return (geo or "").lower(), (category or "").lower()
+
+    def _add(self, entry: dict):
+        entry["normalized_name"] = entry.get("normalized_name") or ""
+        entry["ascii_name"] = entry.get("ascii_name") or ""
+        self._by_id[entry["id"]] = entry
+        self._by_key.setdefault(self._key(entry["geo"], entry["category"]), {})[entry["id"]] = entry
+
+    def remove(self, rec_id: int):
+        entry = self._by_id.pop(rec_id, None)
+        if entry is None:
+            return
+        bucket = self._by_key.get(self._key(entry["geo"], entry["category"]))
+        if bucket is not None:
+            bucket.pop(rec_id, None)
+            if not bucket:
+                del self._by_key[self._key(entry["geo"], entry["category"])]
+
+    def upsert(self, row: dict, normalized_name: str = None, ascii_name: str = None):
+        """
+        Adds or replaces a row. Normalized names are kept from the previous
+        entry when the name did not change, otherwise they are recomputed.
+        """
+        previous = self._by_id.get(row["id"])
+        entry = {k: row.get(k) for k in ("id", "name", "category", "geo", "status", "reason")}
+        if normalized_name is None or ascii_name is None:
+            if previous is not None and previous["name"] == entry["name"]:
+                normalized_name = normalized_name or previous["normalized_name"]
+                ascii_name = ascii_name or previous["ascii_name"]
+            else:
+                normalized_name = normalized_name or sanitize_cyr(entry["name"])
+                ascii_name = ascii_name or sanitize_ascii(entry["name"])
+        entry["normalized_name"] = normalized_name
+        entry["ascii_name"] = ascii_name
+        self.remove(row["id"])
+        self._add(entry)
+
+    def _candidates(self, loc: str, cat: str) -> list[dict]:
+        keys = [(loc, cat)]
+        if cat != UNIVERSAL_CATEGORY:
+            keys.append((loc, UNIVERSAL_CATEGORY))
+        candidates = []
+        for key in keys:
+            candidates.extend(self._by_key.get(key, {}).values())
+        candidates.sort(key=lambda e: e["id"])
+        return candidates
+
+    def approved_names(self, loc: str, cat: str) -> list[str]:
+        bucket = self._by_key.get((loc, cat), {})
+        return sorted({entry["name"] for entry in bucket.values() if entry["status"] == APPROVED_STATUS})
+
+    @staticmethod
+    def _public(entry: dict, cat: str) -> dict:
+        rec = {k: entry[k] for k in ("id", "name", "category", "geo", "status", "reason")}
+        if rec['category'] == UNIVERSAL_CATEGORY and cat != UNIVERSAL_CATEGORY:
+            rec['category'] = cat
+        return rec
+
+    def _rank(self, candidates: list[dict], cyr: str, asc: str) -> tuple[int, list[dict]] | None:
+        """
+        Returns (match tier, entries) for the best tier found: 1 - exact, 2 - substring, 3 - fuzzy.
+        """
+        # 1) exact match
+        for entry in candidates:
+            if entry["normalized_name"] == cyr or entry["ascii_name"] == asc:
+                return 1, [entry]
+
+        # 2) substring match
+        substring = [
+            entry for entry in candidates
+            if cyr in entry["normalized_name"] or asc in entry["ascii_name"]
+        ]
+        if substring:
+            return 2, substring[:RESULT_LIMIT]
+
+        # 3) fuzzy match
+        scored = []
+        for entry in candidates:
+            score = max(
+                fuzz.ratio(entry["normalized_name"], cyr),
+                fuzz.ratio(entry["ascii_name"], asc),
+            )
+            if score > self.min_similarity:
+                scored.append((score, entry))
+        if scored:
+            scored.sort(key=lambda item: item[0], reverse=True)
+            return 3, [entry for _, entry in scored[:RESULT_LIMIT]]
+        return None
+
+    def search(self, cyr: str, asc: str, cat: str, loc: str) -> Union[
+        Dict[str, Any], List[Dict[str, Any]], None]:
+        """
+        Same contract as CelebrityService.find_celebrity: dict for an exact
+        match, list for substring/fuzzy matches, None if nothing found.
+        """
+        ranked = self._rank(self._candidates(loc, cat), cyr, asc)
+        if ranked is None:
+            return None
+        tier, entries = ranked
+        if tier == 1:
+            return self._public(entries[0], cat)
+        return [self._public(entry, cat) for entry in entries]
+
+    def search_all_categories(self, cyr: str, asc: str, loc: str) -> dict[str, dict]:
+        """
+        Best match per category of the geo, each category searched on its own rows only.
+        """
+        result = {}
+        for (geo, category), bucket in self._by_key.items():
+            if geo != loc:
+                continue
+            ranked = self._rank(sorted(bucket.values(), key=lambda e: e["id"]), cyr, asc)
+            if ranked is not None:
+                result[category] = self._public(ranked[1][0], category)
+        return result
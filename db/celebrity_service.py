@@ -1,12 +1,339 @@
 import re
+from datetime import datetime
 from typing import Dict, Any, Union, List
 
+import config
+from db.celebrity_index import CelebrityIndex
+from db.connection import acquire
+from db.database_manager import RESYNC
+from db.listing_cache import ListingCache, separator
+from db.search_cache import SearchCache
+from db.statements import STATEMENTS
 from utils import sanitize_cyr, sanitize_ascii
 
 
+GET_BY_ID = STATEMENTS.register("celebrities.get_by_id", """
+    SELECT id, name, category, geo, status, reason
+    FROM celebrities
+    WHERE id = $1
+""")
+
+UPSERT = STATEMENTS.register("celebrities.upsert", """
+    INSERT INTO celebrities
+      (name, normalized_name, ascii_name, category, geo, status, reason)
+    VALUES
+      (
+        $1,
+        $2,  -- normalized_name
+        $3,  -- ascii_name
+        $4, $5, $6, $7
+      )
+    ON CONFLICT (name, category, geo) DO UPDATE
+      SET status          = EXCLUDED.status,
+          normalized_name = EXCLUDED.normalized_name,
+          ascii_name      = EXCLUDED.ascii_name
+    RETURNING id, name, category, geo, status, reason;
+""")
+
+UPSERT_MANY = STATEMENTS.register("celebrities.upsert_many", """
+    INSERT INTO celebrities
+      (name, normalized_name, ascii_name, category, geo, status, reason)
+    SELECT *
+      FROM unnest($1::text[], $2::text[], $3::text[], $4::text[], $5::text[], $6::text[], $7::text[])
+    ON CONFLICT (name, category, geo) DO UPDATE
+      SET status          = EXCLUDED.status,
+          normalized_name = EXCLUDED.normalized_name,
+          ascii_name      = EXCLUDED.ascii_name
+    RETURNING id, name, category, geo, status, reason;
+""")
+
+UPDATE_BY_ID = STATEMENTS.register("celebrities.update_by_id", """
+    WITH old AS (
+        SELECT id, geo, category
+          FROM celebrities
+         WHERE id = $1
+           FOR UPDATE
+    )
+    UPDATE celebrities c
+       SET name            = $2,
+           normalized_name = $3,
+           ascii_name      = $4,
+           category        = $5,
+           geo             = $6,
+           status          = $7,
+           reason          = $8
+      FROM old
+     WHERE c.id = old.id
+    RETURNING c.id, c.name, c.category, c.geo, c.status, c.reason,
+              old.geo AS old_geo, old.category AS old_category;
+""")
+
+UPDATE_BY_KEY = STATEMENTS.register("celebrities.update_by_key", """
+    UPDATE celebrities
+       SET name            = COALESCE($1, name),
+           normalized_name = COALESCE($2, normalized_name),
+           ascii_name      = COALESCE($3, ascii_name),
+           category        = COALESCE($4, category),
+           geo             = COALESCE($5, geo),
+           status          = COALESCE($6, status),
+           reason          = COALESCE($7, reason)
+     WHERE lower(name) = lower($8)
+       AND lower(geo) = lower($9)
+       AND lower(category) = lower($10)
+    RETURNING id, name, category, geo, status, reason;
+""")
+
+DELETE_BY_KEY = STATEMENTS.register("celebrities.delete_by_key", """
+    DELETE FROM celebrities
+     WHERE name = $1 AND category = $2 AND geo = $3
+    RETURNING id;
+""")
+
+DELETE_BY_ID = STATEMENTS.register("celebrities.delete_by_id", """
+    DELETE FROM celebrities WHERE id = $1 RETURNING geo, category;
+""")
+
+SYNC_FROM_UNIVERSAL = STATEMENTS.register("celebrities.sync_from_universal", """
+    UPDATE celebrities
+    SET status = $3,
+        reason = $4
+    WHERE name = $1 
+      AND geo = $2 
+      AND category != 'все'
+      AND status IS DISTINCT FROM $3
+    RETURNING id, name, category, geo, status, reason;
+""")
+
+FIND_RANKED = STATEMENTS.register("celebrities.find_ranked", """
+    WITH candidates AS (
+        SELECT id, name, category, geo, status, reason,
+               CASE
+                 WHEN normalized_name = $3 OR ascii_name = $4 THEN 1
+                 WHEN normalized_name LIKE '%' || $3 || '%'
+                   OR ascii_name      LIKE '%' || $4 || '%' THEN 2
+                 WHEN similarity(normalized_name, $3) > $5
+                   OR similarity(ascii_name,      $4) > $5 THEN 3
+               END AS match_tier,
+               GREATEST(
+                 similarity(normalized_name, $3),
+                 similarity(ascii_name,      $4)
+               ) AS score
+          FROM celebrities
+         WHERE lower(geo) = $1
+           AND (lower(category) = $2 OR lower(category) = 'все')
+           AND (
+                normalized_name = $3
+             OR ascii_name      = $4
+             OR normalized_name LIKE '%' || $3 || '%'
+             OR ascii_name      LIKE '%' || $4 || '%'
+             OR normalized_name % $3
+             OR ascii_name      % $4
+           )
+    ), ranked AS (
+        SELECT *, min(match_tier) OVER () AS best_tier
+          FROM candidates
+         WHERE match_tier IS NOT NULL
+    )
+    SELECT id, name, category, geo, status, reason, match_tier, score
+      FROM ranked
+     WHERE match_tier = best_tier
+     ORDER BY score DESC, id
+     LIMIT 5
+""")
+
+FIND_RANKED_BATCH = STATEMENTS.register("celebrities.find_ranked_batch", """
+    WITH q AS (
+        SELECT *
+          FROM unnest($3::text[], $4::text[]) WITH ORDINALITY AS q(cyr, asc_name, ord)
+    ), candidates AS (
+        SELECT q.ord, c.id, c.name, c.category, c.geo, c.status, c.reason,
+               CASE
+                 WHEN c.normalized_name = q.cyr OR c.ascii_name = q.asc_name THEN 1
+                 WHEN c.normalized_name LIKE '%' || q.cyr || '%'
+                   OR c.ascii_name      LIKE '%' || q.asc_name || '%' THEN 2
+                 WHEN similarity(c.normalized_name, q.cyr) > $5
+                   OR similarity(c.ascii_name,      q.asc_name) > $5 THEN 3
+               END AS match_tier,
+               GREATEST(
+                 similarity(c.normalized_name, q.cyr),
+                 similarity(c.ascii_name,      q.asc_name)
+               ) AS score
+          FROM q
+          JOIN celebrities c
+            ON lower(c.geo) = $1
+           AND (lower(c.category) = $2 OR lower(c.category) = 'все')
+           AND (
+                c.normalized_name = q.cyr
+             OR c.ascii_name      = q.asc_name
+             OR c.normalized_name LIKE '%' || q.cyr || '%'
+             OR c.ascii_name      LIKE '%' || q.asc_name || '%'
+             OR c.normalized_name % q.cyr
+             OR c.ascii_name      % q.asc_name
+           )
+    ), ranked AS (
+        SELECT *,
+               min(match_tier) OVER (PARTITION BY ord) AS best_tier,
+               row_number() OVER (PARTITION BY ord, match_tier ORDER BY score DESC, id) AS rn
+          FROM candidates
+         WHERE match_tier IS NOT NULL
+    )
+    SELECT ord, id, name, category, geo, status, reason, match_tier, score
+      FROM ranked
+     WHERE match_tier = best_tier
+       AND rn <= 5
+     ORDER BY ord, score DESC, id
+""")
+
+FIND_ALL_CATEGORIES = STATEMENTS.register("celebrities.find_all_categories", """
+    WITH candidates AS (
+        SELECT id, name, lower(category) AS category, geo, status, reason,
+               CASE
+                 WHEN normalized_name = $2 OR ascii_name = $3 THEN 1
+                 WHEN normalized_name LIKE '%' || $2 || '%'
+                   OR ascii_name      LIKE '%' || $3 || '%' THEN 2
+                 WHEN similarity(normalized_name, $2) > $4
+                   OR similarity(ascii_name,      $3) > $4 THEN 3
+               END AS match_tier,
+               GREATEST(
+                 similarity(normalized_name, $2),
+                 similarity(ascii_name,      $3)
+               ) AS score
+          FROM celebrities
+         WHERE lower(geo) = $1
+           AND (
+                normalized_name = $2
+             OR ascii_name      = $3
+             OR normalized_name LIKE '%' || $2 || '%'
+             OR ascii_name      LIKE '%' || $3 || '%'
+             OR normalized_name % $2
+             OR ascii_name      % $3
+           )
+    )
+    SELECT DISTINCT ON (category) id, name, category, geo, status, reason
+      FROM candidates
+     WHERE match_tier IS NOT NULL
+     ORDER BY category, match_tier, score DESC, id
+""")
+
+LISTING_APPROVED = STATEMENTS.register("celebrities.listing_approved", """
+    SELECT DISTINCT name
+      FROM celebrities
+     WHERE lower(category) = lower($1) AND lower(geo) = lower($2) AND status = 'согласована'
+     ORDER BY name;
+""")
+
+CATEGORIES_BY_GEO = STATEMENTS.register("celebrities.categories_by_geo", """
+    SELECT DISTINCT category
+      FROM celebrities
+     WHERE lower(geo) = lower($1)
+     ORDER BY category;
+""")
+
+COUNT_ALL = STATEMENTS.register("celebrities.count_all", """
+    SELECT count(*) FROM celebrities
+""")
+
+EXPORT_CHUNK = STATEMENTS.register("celebrities.export_chunk", """
+    SELECT id, name, category, geo, status, reason
+      FROM celebrities
+     WHERE id > $1
+     ORDER BY id
+     LIMIT $2
+""")
+
+EXPORT_CHANGED_CHUNK = STATEMENTS.register("celebrities.export_changed_chunk", """
+    SELECT id, name, category, geo, status, reason
+      FROM celebrities
+     WHERE updated_at > $1
+       AND id > $2
+     ORDER BY id
+     LIMIT $3
+""")
+
+COUNT_CHANGED = STATEMENTS.register("celebrities.count_changed", """
+    SELECT count(*) FROM celebrities WHERE updated_at > $1
+""")
+
+DELETED_SINCE = STATEMENTS.register("celebrities.deleted_since", """
+    SELECT id FROM celebrity_deletions WHERE deleted_at > $1 ORDER BY id
+""")
+
+PRUNE_DELETIONS = STATEMENTS.register("celebrities.prune_deletions", """
+    DELETE FROM celebrity_deletions WHERE deleted_at <= $1
+""")
+
+# updated_at/deleted_at — начало транзакции (now()), а видны строки только после коммита.
+# Поэтому точка синхронизации — не позже начала самой старой незавершённой транзакции:
+# всё, что она запишет, попадёт в следующую выгрузку, сколько бы она ни длилась
+SYNC_POINT = STATEMENTS.register("sync.point", """
+    SELECT least(clock_timestamp(), min(xact_start))
+      FROM pg_stat_activity
+     WHERE datname = current_database()
+       AND xact_start IS NOT NULL
+       AND pid <> pg_backend_pid()
+""")
+
+GET_WATERMARK = STATEMENTS.register("sync.get_watermark", """
+    SELECT synced_at FROM sync_watermarks WHERE name = $1
+""")
+
+SET_WATERMARK = STATEMENTS.register("sync.set_watermark", """
+    INSERT INTO sync_watermarks (name, synced_at) VALUES ($1, $2)
+    ON CONFLICT (name) DO UPDATE SET synced_at = EXCLUDED.synced_at
+""")
+
+# тот же вид, что у строки в гугл таблице после lower() — для сверки хэшей
+ROW_HASHES = STATEMENTS.register("celebrities.row_hashes", """
+    SELECT id,
+           md5(concat_ws(chr(31),
+               id::text, lower(name), lower(coalesce(category, '')), lower(coalesce(geo, '')),
+               coalesce(status, ''), coalesce(reason, '')
+           )) AS hash
+      FROM celebrities
+""")
+
+GET_MANY_BY_ID = STATEMENTS.register("celebrities.get_many_by_id", """
+    SELECT id, name, category, geo, status, reason
+      FROM celebrities
+     WHERE id = ANY($1::int[])
+     ORDER BY id
+""")
+
+
 class CelebrityService:
-    def __init__(self, pool):
+    def __init__(self, pool, index: CelebrityIndex = None, cache: SearchCache = None, listings: ListingCache = None):
         self.pool = pool
+        self.index = index if index is not None else CelebrityIndex()
+        self.cache = cache if cache is not None else SearchCache()
+        self.listings = listings if listings is not None else ListingCache()
+
+    def _invalidate(self, geo: str | None, category: str | None):
+        self.cache.invalidate(geo, category)
+        self.listings.invalidate(geo, category)
+
+    async def load_index(self) -> int:
+        """
+        Loads the in-memory search index. Until it is loaded find_celebrity queries Postgres.
+        """
+        return await self.index.load(self.pool)
+
+    async def apply_change(self, event: dict):
+        """
+        Change feed handler (DatabaseManager.subscribe): keeps the index and
+        caches coherent with writes made by other processes.
+        """
+        if event["op"] == RESYNC:
+            if self.index.loaded:
+                await self.load_index()
+            self.cache.clear()
+            self.listings.clear()
+            return
+        # сначала индекс, потом кэши: иначе поиск между ними закэширует старые данные
+        if self.index.loaded:
+            await self.index.refresh(self.pool, event["id"])
+        if "old_geo" in event:
+            self._invalidate(event["old_geo"], event["old_category"])
+        self._invalidate(event["geo"], event["category"])
 
     async def find_celebrity(self, name: str, category: str, geo: str) -> Union[
         Dict[str, Any], List[Dict[str, Any]], None]:
@@ -14,101 +341,182 @@ class CelebrityService:
         asc = sanitize_ascii(name)
         cat = category.lower()
         loc = geo.lower()
-        MIN_SIMILARITY = 0.8
 
-        params = [loc, cat, cyr, asc]
-        base_filter = """
-           WHERE lower(geo) = $1
-             AND (lower(category) = $2 OR lower(category) = 'все')
+        key = (cyr, asc, cat, loc)
+        hit, result = self.cache.get(key)
+        if hit:
+            return result
+
+        if self.index.loaded:
+            result = self.index.search(cyr, asc, cat, loc)
+        else:
+            result = await self._find_in_db(cyr, asc, cat, loc)
+        self.cache.set(key, result)
+        return result
+
+    async def _find_in_db(self, cyr: str, asc: str, cat: str, loc: str) -> Union[
+        Dict[str, Any], List[Dict[str, Any]], None]:
         """
+        Exact, substring and fuzzy candidates in one statement. Every row is tagged
+        with its match tier (1 - exact, 2 - substring, 3 - fuzzy) and only rows
+        of the best tier found are returned.
+        """
+        MIN_SIMILARITY = config.FUZY_THRESHOLD / 100
 
-        async with self.pool.acquire() as conn:
-            # 1) exact match
-            row = await conn.fetchrow(
-                f"""
-                SELECT id, name, category, geo, status, reason
-                  FROM celebrities
-                  {base_filter}
-                   AND (
-                        normalized_name = $3
-                     OR ascii_name      = $4
-                   )
-                """,
-                *params
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(
+                conn, FIND_RANKED,
+                loc, cat, cyr, asc, MIN_SIMILARITY
             )
-            if row:
-                result = dict(row)
-                if result['category'] == 'все' and cat != 'все':
-                    result['category'] = cat
-                return result
-
-            # 2) substring match
-            rows = await conn.fetch(
-                f"""
-                SELECT id, name, category, geo, status, reason
-                    FROM celebrities
-                  {base_filter}
-                   AND (
-                        normalized_name LIKE '%' || $3 || '%'
-                     OR ascii_name      LIKE '%' || $4 || '%'
-                   )
-                 LIMIT 5
-                """,
-                *params
+
+        return self._ranked_to_result(rows, cat)
+
+    async def find_celebrities_batch(self, names: list[str], category: str, geo: str) -> list[Union[
+        Dict[str, Any], List[Dict[str, Any]], None]]:
+        """
+        Resolves many names at once. Returns one find_celebrity-style result per name, in input order.
+        """
+        if not names:
+            return []
+
+        cyrs = [sanitize_cyr(name) for name in names]
+        ascs = [sanitize_ascii(name) for name in names]
+        cat = category.lower()
+        loc = geo.lower()
+
+        if self.index.loaded:
+            return [self.index.search(cyr, asc, cat, loc) for cyr, asc in zip(cyrs, ascs)]
+
+        MIN_SIMILARITY = config.FUZY_THRESHOLD / 100
+
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(
+                conn, FIND_RANKED_BATCH,
+                loc, cat, cyrs, ascs, MIN_SIMILARITY
             )
-            if rows:
-                result = []
-                for r in rows:
-                    rec = dict(r)
-                    if rec['category'] == 'все' and cat != 'все':
-                        rec['category'] = cat
-                    result.append(rec)
-                return result
-
-            # 3) fuzzy match
-            rows = await conn.fetch(
-                f"""
-                SELECT id, name, category, geo, status, reason
-                    FROM celebrities
-                  {base_filter}
-                   AND (
-                        normalized_name % $3
-                     OR ascii_name      % $4
-                   )
-                   AND (
-                        similarity(normalized_name, $3) > $5
-                     OR similarity(ascii_name,      $4) > $5
-                   )
-                 ORDER BY
-                   GREATEST(
-                     similarity(normalized_name, $3),
-                     similarity(ascii_name,      $4)
-                   ) DESC
-                 LIMIT 5
-                """,
-                *params, MIN_SIMILARITY
+
+        grouped: dict[int, list] = {}
+        for r in rows:
+            rec = dict(r)
+            grouped.setdefault(rec.pop('ord'), []).append(rec)
+        return [self._ranked_to_result(grouped.get(i, []), cat) for i in range(1, len(names) + 1)]
+
+    async def find_celebrity_all_categories(self, name: str, geo: str) -> dict[str, dict]:
+        """
+        Best match of the name in every category of the geo, in one query.
+        Returns {category: record}; categories without a match are absent.
+        """
+        cyr = sanitize_cyr(name)
+        asc = sanitize_ascii(name)
+        loc = geo.lower()
+
+        if self.index.loaded:
+            return self.index.search_all_categories(cyr, asc, loc)
+
+        MIN_SIMILARITY = config.FUZY_THRESHOLD / 100
+
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(
+                conn, FIND_ALL_CATEGORIES,
+                loc, cyr, asc, MIN_SIMILARITY
             )
-            if rows:
-                result = []
-                for r in rows:
-                    rec = dict(r)
-                    if rec['category'] == 'все' and cat != 'все':
-                        rec['category'] = cat
-                    result.append(rec)
-                return result
+        return {row['category']: dict(row) for row in rows}
+
+    @staticmethod
+    def _ranked_to_result(rows, cat: str) -> Union[Dict[str, Any], List[Dict[str, Any]], None]:
+        if not rows:
+            return None
+
+        result = []
+        for r in rows:
+            rec = dict(r)
+            rec.pop('score')
+            tier = rec.pop('match_tier')
+            if rec['category'] == 'все' and cat != 'все':
+                rec['category'] = cat
+            if tier == 1:
+                return rec
+            result.append(rec)
+        return result
 
     async def get_by_id(self, id: int) -> dict:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                """
-                SELECT id, name, category, geo, status, reason
-                FROM celebrities
-                WHERE id = $1
-                """,
+        async with acquire(self.pool) as conn:
+            row = await STATEMENTS.fetchrow(
+                conn, GET_BY_ID,
                 id
             )
             return dict(row) if row else None
 
+    async def count_celebrities(self) -> int:
+        async with acquire(self.pool) as conn:
+            return await STATEMENTS.fetchval(conn, COUNT_ALL)
+
+    async def iter_chunks(self, chunk_size: int):
+        """
+        Yields all rows ordered by id, chunk by chunk (keyset on id), so no
+        connection is held between chunks.
+        """
+        last_id = 0
+        while True:
+            async with acquire(self.pool) as conn:
+                rows = await STATEMENTS.fetch(conn, EXPORT_CHUNK, last_id, chunk_size)
+            if not rows:
+                return
+            yield [dict(row) for row in rows]
+            last_id = rows[-1]["id"]
+
+    async def iter_changed_chunks(self, since: datetime, chunk_size: int):
+        """
+        Like iter_chunks, but only rows changed after ``since``.
+        """
+        last_id = 0
+        while True:
+            async with acquire(self.pool) as conn:
+                rows = await STATEMENTS.fetch(conn, EXPORT_CHANGED_CHUNK, since, last_id, chunk_size)
+            if not rows:
+                return
+            yield [dict(row) for row in rows]
+            last_id = rows[-1]["id"]
+
+    async def count_changed(self, since: datetime) -> int:
+        async with acquire(self.pool) as conn:
+            return await STATEMENTS.fetchval(conn, COUNT_CHANGED, since)
+
+    async def get_deleted_since(self, since: datetime) -> list[int]:
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(conn, DELETED_SINCE, since)
+        return [row["id"] for row in rows]
+
+    async def prune_deletions(self, before: datetime):
+        async with acquire(self.pool) as conn:
+            await STATEMENTS.execute(conn, PRUNE_DELETIONS, before)
+
+    async def sync_point(self) -> datetime:
+        """
+        Watermark for a sync starting now: rows changed before it are
+        already committed and visible. Server time, since updated_at is.
+        """
+        async with acquire(self.pool) as conn:
+            return await STATEMENTS.fetchval(conn, SYNC_POINT)
+
+    async def get_sync_watermark(self, name: str) -> datetime | None:
+        async with acquire(self.pool) as conn:
+            return await STATEMENTS.fetchval(conn, GET_WATERMARK, name)
+
+    async def set_sync_watermark(self, name: str, synced_at: datetime):
+        async with acquire(self.pool) as conn:
+            await STATEMENTS.execute(conn, SET_WATERMARK, name, synced_at)
+
+    async def get_row_hashes(self) -> dict[int, str]:
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(conn, ROW_HASHES)
+        return {row["id"]: row["hash"] for row in rows}
+
+    async def get_by_ids(self, ids: list[int]) -> dict[int, dict]:
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(conn, GET_MANY_BY_ID, ids)
+        return {row["id"]: dict(row) for row in rows}
+
     async def insert_celebrity(self, name: str, category: str, geo: str, status: str, reason: str = None) -> dict:
         """
         Вставляет (или обновляет) селебу, заполняя сразу normalized_name и ascii_name.
@@ -116,51 +524,79 @@ class CelebrityService:
         ascii_val = sanitize_ascii(name)
         cyr_name = sanitize_cyr(name)
 
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                """
-                INSERT INTO celebrities
-                  (name, normalized_name, ascii_name, category, geo, status, reason)
-                VALUES
-                  (
-                    $1,
-                    $2,  -- normalized_name
-                    $3,  -- ascii_name
-                    $4, $5, $6, $7
-                  )
-                ON CONFLICT (name, category, geo) DO UPDATE
-                  SET status          = EXCLUDED.status,
-                      normalized_name = EXCLUDED.normalized_name,
-                      ascii_name      = EXCLUDED.ascii_name
-                RETURNING id, name, category, geo, status, reason;
-                """,
+        async with acquire(self.pool) as conn:
+            row = await STATEMENTS.fetchrow(
+                conn, UPSERT,
                 name, cyr_name, ascii_val, category, geo, status, reason
             )
-            return dict(row)
+        self.index.upsert(dict(row), normalized_name=cyr_name, ascii_name=ascii_val)
+        self._invalidate(row["geo"], row["category"])
+        return dict(row)
+
+    async def insert_celebrities(self, records: list[dict]) -> list[dict]:
+        """
+        Bulk version of insert_celebrity: one multi-row upsert for all records
+        (name, category, geo, status, reason). Duplicate keys keep the last record.
+        """
+        unique = {(r["name"], r["category"], r["geo"]): r for r in records}
+        if not unique:
+            return []
+        names = [r["name"] for r in unique.values()]
+        cyr_names = [sanitize_cyr(name) for name in names]
+        ascii_names = [sanitize_ascii(name) for name in names]
+
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(
+                conn, UPSERT_MANY,
+                names, cyr_names, ascii_names,
+                [r["category"] for r in unique.values()],
+                [r["geo"] for r in unique.values()],
+                [r["status"] for r in unique.values()],
+                [r.get("reason") for r in unique.values()],
+            )
+        normalized = {name: (cyr, asc) for name, cyr, asc in zip(names, cyr_names, ascii_names)}
+        for row in rows:
+            cyr, asc = normalized[row["name"]]
+            self.index.upsert(dict(row), normalized_name=cyr, ascii_name=asc)
+            self._invalidate(row["geo"], row["category"])
+        return [dict(row) for row in rows]
 
     async def get_celebrities(self, geo:str , cat: str) -> list[str] | None:
         """
         Returns all celebrities by geo and category with status = 'approved'
         """
-        async with self.pool.acquire() as conn:
-            sql = """
-            SELECT DISTINCT name 
-            FROM celebrities
-            WHERE category = lower($1) AND geo = lower($2) AND status = 'согласована';
-            """
-            params = [cat, geo]
-            rows = await conn.fetch(sql, *params)
-            return [row['name'] for row in rows]
+        return list(await self._get_listing(geo, cat))
+
+    async def get_celebrities_page(self, geo: str, cat: str, key: str = "",
+                                   backward: bool = False) -> tuple[list[str], str | None, str | None]:
+        """
+        One page of the approved listing: names >= key, or the page ending
+        right before key when ``backward``. Returns the names and the keys
+        of the previous and next pages (None at the ends). Served from memory.
+        """
+        names = await self._get_listing(geo, cat)
+        start, end = self.listings.page(names, key, backward)
+        prev_key = separator(names[start - 1], names[start]) if start > 0 else None
+        next_key = separator(names[end - 1], names[end]) if end < len(names) else None
+        return names[start:end], prev_key, next_key
+
+    async def _get_listing(self, geo: str, cat: str) -> list[str]:
+        names = self.listings.get(geo, cat)
+        if names is not None:
+            return names
+
+        if self.index.loaded:
+            names = self.index.approved_names(geo.lower(), cat.lower())
+        else:
+            async with acquire(self.pool) as conn:
+                rows = await STATEMENTS.fetch(conn, LISTING_APPROVED, cat, geo)
+            names = [row['name'] for row in rows]
+        return self.listings.set(geo, cat, names)
 
     async def get_categories_by_geo(self, geo: str) -> list[str]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                """
-                SELECT DISTINCT category
-                  FROM celebrities
-                 WHERE geo = lower($1)
-                 ORDER BY category;
-                """,
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(
+                conn, CATEGORIES_BY_GEO,
                 geo
             )
         return [r["category"] for r in rows]
@@ -183,44 +619,31 @@ class CelebrityService:
         if new_reason:
             updates["reason"] = new_reason.lower().strip()
 
-        set_clauses = []
-        set_values = []
-        for i, (col, val) in enumerate(updates.items(), start=1):
-            set_clauses.append(f"{col} = ${i}")
-            set_values.append(val.lower())
-        set_sql = ", ".join(set_clauses)
-
-        where_values = [name, geo, category]
-        idx = len(set_values)
-        where_sql = (
-            f"lower(name) = lower(${idx+1}) "
-            f"AND lower(geo) = lower(${idx+2}) "
-            f"AND lower(category) = lower(${idx+3})"
-        )
-
-        query = f"""
-            UPDATE celebrities
-            SET {set_sql}
-            WHERE {where_sql}
-            RETURNING id, name, category, geo, status, reason;
-        """
-
-        params = set_values + where_values
+        params = [
+            updates.get("name"), updates.get("normalized_name"), updates.get("ascii_name"),
+            updates.get("category"), updates.get("geo"), updates.get("status"), updates.get("reason"),
+            name, geo, category,
+        ]
 
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(query, *params)
-            return dict(row) if row else None
+        async with acquire(self.pool) as conn:
+            row = await STATEMENTS.fetchrow(conn, UPDATE_BY_KEY, *params)
+        self._invalidate(geo, category)
+        if not row:
+            return None
+        self._invalidate(row["geo"], row["category"])
+        if new_name:
+            self.index.upsert(dict(row), normalized_name=updates["normalized_name"], ascii_name=updates["ascii_name"])
+        else:
+            self.index.upsert(dict(row))
+        return dict(row)
 
     async def delete_celebrity(self, name: str, geo: str, category: str, status: str) -> None:
-
-        query = """
-        DELETE FROM celebrities
-        WHERE name = $1 AND category = $2 AND geo = $3;
-        """
-
         params = [name, category, geo]
-        async with self.pool.acquire() as conn:
-            await conn.execute(query, *params)
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(conn, DELETE_BY_KEY, *params)
+        for row in rows:
+            self.index.remove(row["id"])
+        self._invalidate(geo, category)
 
     async def update_by_id(self, rec_id: int, *, name: str, category: str, geo: str, status: str, reason: str = None) -> dict:
         """
@@ -229,46 +652,36 @@ class CelebrityService:
         ascii_val = sanitize_ascii(name)
         cyr_name  = sanitize_cyr(name)
 
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                """
-                UPDATE celebrities
-                   SET name            = $2,
-                       normalized_name = $3,
-                       ascii_name      = $4,
-                       category        = $5,
-                       geo             = $6,
-                       status          = $7,
-                       reason          = $8
-                 WHERE id = $1
-                RETURNING id, name, category, geo, status, reason;
-                """,
+        async with acquire(self.pool) as conn:
+            row = await STATEMENTS.fetchrow(
+                conn, UPDATE_BY_ID,
                 rec_id, name, cyr_name, ascii_val, category, geo, status, reason
             )
             if not row:
                 raise ValueError(f"No celebrity with id={rec_id}")
-            return dict(row)
+        result = dict(row)
+        self._invalidate(result.pop("old_geo"), result.pop("old_category"))
+        self._invalidate(result["geo"], result["category"])
+        self.index.upsert(result, normalized_name=cyr_name, ascii_name=ascii_val)
+        return result
 
     async def delete_by_id(self, rec_id: int) -> None:
-        async with self.pool.acquire() as conn:
-            await conn.execute("DELETE FROM celebrities WHERE id = $1", rec_id)
+        async with acquire(self.pool) as conn:
+            row = await STATEMENTS.fetchrow(conn, DELETE_BY_ID, rec_id)
+        self.index.remove(rec_id)
+        if row:
+            self._invalidate(row["geo"], row["category"])
 
     async def sync_status_from_universal(self, geo:str, name:str, status:str, reason:str = None) -> list[dict]:
         """
         Synchronises status for geo and category with universal status.
         """
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch(
-                """
-                UPDATE celebrities
-                SET status = $3,
-                    reason = $4
-                WHERE name = $1 
-                  AND geo = $2 
-                  AND category != 'все'
-                  AND status IS DISTINCT FROM $3
-                RETURNING id, name, category, geo, status, reason;
-                """,
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(
+                conn, SYNC_FROM_UNIVERSAL,
                 name, geo, status, reason
             )
-            return [dict(row) for row in rows]
\ No newline at end of file
+        for row in rows:
+            self.index.upsert(dict(row))
+            self._invalidate(row["geo"], row["category"])
+        return [dict(row) for row in rows]
@@ -0,0 +1,74 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+
+class _BoundConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.active = True
+        self.owner = None
+        self.lock = asyncio.Lock()
+
+
+_bound: ContextVar[_BoundConnection | None] = ContextVar("bound_connection", default=None)
+
+
+@asynccontextmanager
+async def acquire(pool):
+    """
+    Drop-in replacement for ``pool.acquire()`` used by all services.
+    Inside ``bind_connection`` it hands out the update's connection instead of
+    taking a new one from the pool. Concurrent tasks of the same update are
+    serialised on it, since an asyncpg connection runs one query at a time.
+    """
+    bound = _bound.get()
+    if bound is None or not bound.active:
+        async with pool.acquire() as conn:
+            yield conn
+        return
+
+    task = asyncio.current_task()
+    if bound.owner is task:
+        yield bound.conn
+        return
+
+    async with bound.lock:
+        bound.owner = task
+        try:
+            yield bound.conn
+        finally:
+            bound.owner = None
+
+
+@asynccontextmanager
+async def bind_connection(pool, transaction: bool = False):
+    """
+    Acquires one connection (optionally inside one transaction) and makes every
+    ``acquire(pool)`` in the current context reuse it until the block exits.
+    Tasks spawned inside the block fall back to the pool once it has exited.
+    Nested inside another ``bind_connection`` it reuses the bound connection
+    (the transaction becomes a savepoint) instead of taking a second one.
+    """
+    bound = _bound.get()
+    if bound is not None and bound.active:
+        async with acquire(pool) as conn:
+            if transaction:
+                async with conn.transaction():
+                    yield conn
+            else:
+                yield conn
+        return
+
+    async with pool.acquire() as conn:
+        bound = _BoundConnection(conn)
+        token = _bound.set(bound)
+        try:
+            if transaction:
+                async with conn.transaction():
+                    yield conn
+            else:
+                yield conn
+        finally:
+            bound.active = False
+            _bound.reset(token)
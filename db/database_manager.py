@@ -1,9 +1,25 @@
-from asyncpg import create_pool, Pool
+import asyncio
+import json
+from typing import Awaitable, Callable
+
+from asyncpg import create_pool, connect, Connection, Pool
 import config
+from db.statements import STATEMENTS
+
+
+CHANGES_CHANNEL = "db_changes"
+# событие после переподключения слушателя: уведомления за время разрыва потеряны
+RESYNC = "RESYNC"
+MAX_RECONNECT_DELAY = 60
 
 
 class DatabaseManager:
     _pool: Pool = None
+    _listener: Connection = None
+    _handlers: dict[str, list[Callable[[dict], Awaitable]]] = {}
+    _events: asyncio.Queue = None
+    _tasks: set[asyncio.Task] = set()
+    _closing = False
 
     @classmethod
     async def init(cls):
@@ -11,7 +27,14 @@ class DatabaseManager:
             cls._pool = await create_pool(
                 dsn=config.DATABASE_URL,
                 min_size=1,
-                max_size=10
+                max_size=10,
+                # startup parameter, so it survives the RESET ALL asyncpg runs on release
+                server_settings={
+                    "pg_trgm.similarity_threshold": str(config.FUZY_THRESHOLD / 100),
+                },
+                # кэш запросов соединения должен вмещать все зарегистрированные запросы
+                statement_cache_size=max(100, len(STATEMENTS) * 2),
+                init=STATEMENTS.prepare,
             )
 
     @classmethod
@@ -20,8 +43,91 @@ class DatabaseManager:
             await cls.init()
         return cls._pool
 
+    @classmethod
+    def subscribe(cls, table: str, handler: Callable[[dict], Awaitable]):
+        """
+        ``handler(event)`` is awaited for every change of ``table`` made by
+        any process, this one included. Events are compact trigger payloads
+        ({"table", "op", ...}); op is INSERT/UPDATE/DELETE, or RESYNC after
+        the listener reconnected and events may have been lost.
+        """
+        cls._handlers.setdefault(table, []).append(handler)
+
+    @classmethod
+    async def start_listener(cls):
+        """
+        Opens a dedicated connection LISTENing on the change channel. Events
+        are handled one by one in arrival order.
+        """
+        if cls._listener is not None:
+            return
+        cls._closing = False
+        cls._events = asyncio.Queue()
+        cls._spawn(cls._dispatch_events())
+        await cls._listen()
+
+    @classmethod
+    async def _listen(cls):
+        # отдельное соединение: пул сбрасывает LISTEN при возврате соединения
+        conn = await connect(dsn=config.DATABASE_URL)
+        await conn.add_listener(CHANGES_CHANNEL, cls._on_notification)
+        conn.add_termination_listener(cls._on_listener_lost)
+        cls._listener = conn
+        config.logger.info(f"Listening for database changes on '{CHANGES_CHANNEL}'")
+
+    @classmethod
+    def _on_notification(cls, conn, pid, channel, payload):
+        try:
+            cls._events.put_nowait(json.loads(payload))
+        except ValueError:
+            config.logger.warning(f"Malformed change event: {payload}")
+
+    @classmethod
+    def _on_listener_lost(cls, conn):
+        cls._listener = None
+        if not cls._closing:
+            config.logger.warning("Change listener connection lost, reconnecting")
+            cls._spawn(cls._reconnect())
+
+    @classmethod
+    async def _reconnect(cls):
+        delay = 1
+        while not cls._closing:
+            try:
+                await cls._listen()
+            except Exception as e:
+                config.logger.error(f"Change listener reconnect failed, retry in {delay}s", exc_info=e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+                continue
+            for table in cls._handlers:
+                cls._events.put_nowait({"table": table, "op": RESYNC})
+            return
+
+    @classmethod
+    async def _dispatch_events(cls):
+        while True:
+            event = await cls._events.get()
+            for handler in cls._handlers.get(event.get("table"), []):
+                try:
+                    await handler(event)
+                except Exception as e:
+                    config.logger.error(f"Change handler failed for {event}", exc_info=e)
+
+    @classmethod
+    def _spawn(cls, coro):
+        task = asyncio.get_running_loop().create_task(coro)
+        cls._tasks.add(task)
+        task.add_done_callback(cls._tasks.discard)
+
     @classmethod
     async def close(cls):
+        cls._closing = True
+        if cls._listener is not None:
+            await cls._listener.close()
+            cls._listener = None
+        for task in list(cls._tasks):
+            task.cancel()
         if cls._pool is not None:
             await cls._pool.close()
-            cls._pool = None
\ No newline at end of file
+            cls._pool = None
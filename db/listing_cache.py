@@ -0,0 +1,73 @@
+from bisect import bisect_left
+
+PAGE_SIZE = 50
+PAGE_CHARS = 3500
+
+
+def separator(before: str, after: str) -> str:
+    """
+    Shortest prefix of ``after`` that sorts above ``before`` (before < after):
+    a compact page key that fits into callback data.
+    """
+    for i in range(1, len(after) + 1):
+        if after[:i] > before:
+            return after[:i]
+    return after
+
+
+class ListingCache:
+    """
+    Approved-celebrity listings per (geo, category), sorted by name. Pages
+    that fit into one Telegram message are cut by key (name >= key), so a
+    page doesn't shift when the listing is rebuilt. Entries are dropped by
+    write paths and rebuilt on the next request.
+    """
+
+    def __init__(self, page_size: int = PAGE_SIZE, page_chars: int = PAGE_CHARS):
+        self.page_size = page_size
+        self.page_chars = page_chars
+        self._names: dict[tuple[str, str], list[str]] = {}
+
+    @staticmethod
+    def _key(geo: str | None, category: str | None) -> tuple[str, str]:
+        return (geo or "").lower(), (category or "").lower()
+
+    def get(self, geo: str, category: str) -> list[str] | None:
+        return self._names.get(self._key(geo, category))
+
+    def set(self, geo: str, category: str, names: list[str]) -> list[str]:
+        # сортировка по кодам символов, как сравниваются ключи страниц
+        names = sorted(names)
+        self._names[self._key(geo, category)] = names
+        return names
+
+    def _fits(self, count: int, chars: int, name: str) -> bool:
+        return count < self.page_size and chars + len(name) + 1 <= self.page_chars
+
+    def page(self, names: list[str], key: str = "", backward: bool = False) -> tuple[int, int]:
+        """
+        Bounds [start, end) of the page of names >= key, or of the page
+        ending right before key when ``backward``.
+        """
+        start = end = bisect_left(names, key)
+        count = chars = 0
+        if backward:
+            while start > 0 and (not count or self._fits(count, chars, names[start - 1])):
+                start -= 1
+                count += 1
+                chars += len(names[start]) + 1
+            if start > 0:
+                return start, end
+            # дошли до начала — показываем первую страницу целиком
+            end, count, chars = 0, 0, 0
+        while end < len(names) and (not count or self._fits(count, chars, names[end])):
+            end += 1
+            count += 1
+            chars += len(names[end - 1]) + 1
+        return start, end
+
+    def invalidate(self, geo: str | None, category: str | None):
+        self._names.pop(self._key(geo, category), None)
+
+    def clear(self):
+        self._names.clear()
@@ -0,0 +1,118 @@
+from asyncpg.exceptions import ForeignKeyViolationError
+
+import config
+from db.connection import acquire
+from db.statements import STATEMENTS
+
+
+# строки по уже обработанным заявкам пропускаются join'ом. Возвращает число строк
+# с живой заявкой: уже сохранённые (ON CONFLICT) тоже считаются
+ADD_MESSAGES = STATEMENTS.register("pending_messages.add", """
+    WITH m AS (
+        SELECT m.request_id, m.chat_id, m.message_id, m.batch_id, m.with_actions
+          FROM unnest($1::int[], $2::bigint[], $3::bigint[], $4::int[], $5::bool[])
+               AS m(request_id, chat_id, message_id, batch_id, with_actions)
+          JOIN pending_requests p ON p.id = m.request_id
+    ), inserted AS (
+        INSERT INTO pending_messages(request_id, chat_id, message_id, batch_id, with_actions)
+        SELECT request_id, chat_id, message_id, batch_id, with_actions FROM m
+        ON CONFLICT DO NOTHING
+    )
+    SELECT count(*) FROM m
+""")
+
+POP_MESSAGES = STATEMENTS.register("pending_messages.pop", """
+    DELETE FROM pending_messages
+     WHERE request_id = ANY($1::int[])
+     RETURNING request_id, chat_id, message_id, batch_id, with_actions
+""")
+
+
+def _message(msg: dict) -> dict:
+    # batch_id - сообщение с пачкой заявок, with_actions - есть кнопки модерации
+    return {
+        "chat_id": msg["chat_id"],
+        "message_id": msg["message_id"],
+        "batch_id": msg.get("batch_id"),
+        "with_actions": msg.get("with_actions", True),
+    }
+
+
+class PostgresPendingMessages:
+    """
+    Request -> staff message mapping kept in Postgres, shared by all bot
+    processes and surviving restarts. Rows go away with their pending request.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def add(self, request_id: int, messages: list[dict]) -> bool:
+        """
+        Returns False if the request no longer exists.
+        """
+        return await self.add_many([(request_id, msg) for msg in messages])
+
+    async def add_many(self, entries: list[tuple[int, dict]]) -> bool:
+        """
+        Stores (request_id, message) pairs in one statement.
+        Returns False if some of the requests no longer exist.
+        """
+        if not entries:
+            return True
+        messages = [_message(msg) for _, msg in entries]
+        try:
+            async with acquire(self.pool) as conn:
+                stored = await STATEMENTS.fetchval(
+                    conn, ADD_MESSAGES,
+                    [request_id for request_id, _ in entries],
+                    [m["chat_id"] for m in messages],
+                    [m["message_id"] for m in messages],
+                    [m["batch_id"] for m in messages],
+                    [m["with_actions"] for m in messages],
+                )
+        except ForeignKeyViolationError:
+            return False
+        return stored == len(entries)
+
+    async def pop_many(self, request_ids: list[int]) -> dict[int, list[dict]]:
+        if not request_ids:
+            return {}
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(conn, POP_MESSAGES, list(request_ids))
+        result: dict[int, list[dict]] = {}
+        for row in rows:
+            result.setdefault(row["request_id"], []).append(_message(row))
+        return result
+
+    async def pop(self, request_id: int) -> list[dict]:
+        return (await self.pop_many([request_id])).get(request_id, [])
+
+
+class LocalPendingMessages:
+    """
+    In-process implementation for a single bot process (lost on restart).
+    """
+
+    def __init__(self):
+        self._messages: dict[int, list[dict]] = {}
+
+    async def add(self, request_id: int, messages: list[dict]) -> bool:
+        return await self.add_many([(request_id, msg) for msg in messages])
+
+    async def add_many(self, entries: list[tuple[int, dict]]) -> bool:
+        for request_id, msg in entries:
+            self._messages.setdefault(request_id, []).append(_message(msg))
+        return True
+
+    async def pop_many(self, request_ids: list[int]) -> dict[int, list[dict]]:
+        return {rid: self._messages.pop(rid) for rid in request_ids if rid in self._messages}
+
+    async def pop(self, request_id: int) -> list[dict]:
+        return self._messages.pop(request_id, [])
+
+
+def create_pending_messages_store(pool):
+    if config.PENDING_MESSAGES_STORE == "local":
+        return LocalPendingMessages()
+    return PostgresPendingMessages(pool)
@@ -1,6 +1,174 @@
+from db.connection import acquire, bind_connection
+from db.pending_messages import create_pending_messages_store
+from db.statements import STATEMENTS
+from utils import sanitize_cyr, sanitize_ascii
+
+
+# сериализует добавление заявок с одинаковыми category/geo, чтобы дубли не проскочили
+LOCK_PENDING_KEY = STATEMENTS.register("requests.lock_pending_key", """
+    SELECT pg_advisory_xact_lock(hashtext('pending_requests:' || lower($1) || ':' || lower($2)))
+""")
+
+FIND_EQUIVALENT = STATEMENTS.register("requests.find_equivalent", """
+    SELECT id
+      FROM pending_requests
+     WHERE lower(category) = lower($1)
+       AND lower(geo) = lower($2)
+       AND (normalized_name = $3 OR ascii_name = $4)
+     ORDER BY id
+     LIMIT 1
+""")
+
+ADD_PENDING = STATEMENTS.register("requests.add_pending", """
+    INSERT INTO pending_requests(
+      user_id, chat_id, message_id,
+      celebrity_name, category, geo,
+      bot_message_id, username,
+      normalized_name, ascii_name
+    ) VALUES($1,$2,$3,$4,$5,$6,$7,$8,$9,$10)
+    RETURNING id;
+""")
+
+FIND_EQUIVALENT_MANY = STATEMENTS.register("requests.find_equivalent_many", """
+    SELECT q.ord,
+           (SELECT p.id
+              FROM pending_requests p
+             WHERE lower(p.category) = lower($1)
+               AND lower(p.geo) = lower($2)
+               AND (p.normalized_name = q.cyr OR p.ascii_name = q.asc_name)
+             ORDER BY p.id
+             LIMIT 1) AS id
+      FROM unnest($3::text[], $4::text[]) WITH ORDINALITY AS q(cyr, asc_name, ord)
+""")
+
+ADD_PENDING_MANY = STATEMENTS.register("requests.add_pending_many", """
+    INSERT INTO pending_requests(
+      user_id, chat_id, message_id,
+      celebrity_name, category, geo,
+      bot_message_id, username,
+      normalized_name, ascii_name
+    )
+    SELECT $1, $2, $3, n.name, $5, $6, $7, $8, n.cyr, n.asc_name
+      FROM unnest($4::text[], $9::text[], $10::text[]) AS n(name, cyr, asc_name)
+    RETURNING id, normalized_name
+""")
+
+SET_BATCH = STATEMENTS.register("requests.set_batch", """
+    UPDATE pending_requests SET batch_id = $1 WHERE id = ANY($2::int[])
+""")
+
+GET_BATCH = STATEMENTS.register("requests.get_batch", """
+    SELECT id, celebrity_name, category, geo, username
+      FROM pending_requests
+     WHERE batch_id = $1
+     ORDER BY id
+""")
+
+# автор заявки и уже присоединившиеся не добавляются повторно — иначе ответ придёт им дважды
+ADD_REQUESTERS_MANY = STATEMENTS.register("requests.add_requesters_many", """
+    INSERT INTO pending_request_requesters(
+      request_id, user_id, chat_id, message_id, bot_message_id, username
+    )
+    SELECT r.request_id, $2, $3, $4, $5, $6
+      FROM unnest($1::int[]) AS r(request_id)
+     WHERE NOT EXISTS (SELECT 1 FROM pending_requests p WHERE p.id = r.request_id AND p.user_id = $2)
+       AND NOT EXISTS (SELECT 1 FROM pending_request_requesters q WHERE q.request_id = r.request_id AND q.user_id = $2)
+""")
+
+ADD_REQUESTER = STATEMENTS.register("requests.add_requester", """
+    INSERT INTO pending_request_requesters(
+      request_id, user_id, chat_id, message_id, bot_message_id, username
+    )
+    SELECT $1, $2, $3, $4, $5, $6
+     WHERE NOT EXISTS (SELECT 1 FROM pending_requests WHERE id = $1 AND user_id = $2)
+       AND NOT EXISTS (SELECT 1 FROM pending_request_requesters WHERE request_id = $1 AND user_id = $2)
+""")
+
+POP_REQUESTERS = STATEMENTS.register("requests.pop_requesters", """
+    DELETE FROM pending_request_requesters
+     WHERE request_id = $1
+     RETURNING id, user_id, chat_id, message_id, bot_message_id, username
+""")
+
+POP_REQUESTERS_MANY = STATEMENTS.register("requests.pop_requesters_many", """
+    DELETE FROM pending_request_requesters
+     WHERE request_id = ANY($1::int[])
+     RETURNING id, request_id, user_id, chat_id, message_id, bot_message_id, username
+""")
+
+POP_PENDING_MANY = STATEMENTS.register("requests.pop_pending_many", """
+    DELETE FROM pending_requests
+     WHERE id = ANY($1::int[])
+     RETURNING
+       id,
+       user_id,
+       chat_id,
+       message_id,
+       celebrity_name,
+       category,
+       geo,
+       bot_message_id, username
+""")
+
+POP_PENDING = STATEMENTS.register("requests.pop_pending", """
+    DELETE FROM pending_requests
+     WHERE id = $1
+     RETURNING
+       user_id,
+       chat_id,
+       message_id,
+       celebrity_name,
+       category,
+       geo,
+       bot_message_id, username
+""")
+
+ALL_PENDING = STATEMENTS.register("requests.all_pending", """
+    SELECT id, celebrity_name, category, geo, username
+    FROM pending_requests
+    ORDER BY created_at, id
+""")
+
+# keyset-пагинация по (created_at, id), см. idx_pending_requests_created_at_id
+PAGE_FIRST = STATEMENTS.register("requests.page_first", """
+    SELECT id, celebrity_name, category, geo, username, created_at
+      FROM pending_requests
+     ORDER BY created_at, id
+     LIMIT $1
+""")
+
+PAGE_FROM = STATEMENTS.register("requests.page_from", """
+    SELECT id, celebrity_name, category, geo, username, created_at
+      FROM pending_requests
+     WHERE (created_at, id) >= ($1, $2)
+     ORDER BY created_at, id
+     LIMIT $3
+""")
+
+PAGE_AFTER = STATEMENTS.register("requests.page_after", """
+    SELECT id, celebrity_name, category, geo, username, created_at
+      FROM pending_requests
+     WHERE (created_at, id) > ($1, $2)
+     ORDER BY created_at, id
+     LIMIT $3
+""")
+
+PAGE_BEFORE = STATEMENTS.register("requests.page_before", """
+    SELECT id, celebrity_name, category, geo, username, created_at
+      FROM pending_requests
+     WHERE (created_at, id) < ($1, $2)
+     ORDER BY created_at DESC, id DESC
+     LIMIT $3
+""")
+
+REQUESTER_FIELDS = ("user_id", "chat_id", "message_id", "bot_message_id", "username")
+
+
 class RequestsService:
-    def __init__(self, pool):
+    def __init__(self, pool, messages=None):
         self.pool = pool
+        # копии заявки, разосланные модераторам/наблюдателям
+        self.messages = messages or create_pending_messages_store(pool)
 
     async def add_pending_request(
             self,
@@ -12,45 +180,191 @@ class RequestsService:
             geo: str,
             bot_message_id: int,
             username: str
-    ) -> int:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchval(
-                """
-                INSERT INTO pending_requests(
-                  user_id, chat_id, message_id,
-                  celebrity_name, category, geo,
-                  bot_message_id, username
-                ) VALUES($1,$2,$3,$4,$5,$6,$7,$8)
-                RETURNING id;
-                """,
-                user_id, chat_id, message_id,
-                celebrity_name, category, geo,
-                bot_message_id, username
-            )
+    ) -> tuple[int, bool]:
+        """
+        Adds a request or joins an equivalent pending one (same category/geo and
+        normalized name). Returns (request_id, is_new).
+        """
+        normalized_name = sanitize_cyr(celebrity_name)
+        ascii_name = sanitize_ascii(celebrity_name)
+
+        async with acquire(self.pool) as conn:
+            async with conn.transaction():
+                await STATEMENTS.execute(conn, LOCK_PENDING_KEY, category, geo)
+                request_id = await STATEMENTS.fetchval(
+                    conn, FIND_EQUIVALENT, category, geo, normalized_name, ascii_name
+                )
+                if request_id is not None:
+                    await STATEMENTS.execute(
+                        conn, ADD_REQUESTER,
+                        request_id, user_id, chat_id, message_id, bot_message_id, username
+                    )
+                    return request_id, False
+
+                request_id = await STATEMENTS.fetchval(
+                    conn, ADD_PENDING,
+                    user_id, chat_id, message_id,
+                    celebrity_name, category, geo,
+                    bot_message_id, username,
+                    normalized_name, ascii_name
+                )
+                return request_id, True
+
+    async def add_pending_requests(
+            self,
+            user_id: int,
+            chat_id: int,
+            message_id: int,
+            celebrity_names: list[str],
+            category: str,
+            geo: str,
+            bot_message_id: int,
+            username: str
+    ) -> tuple[list[tuple[int, bool]], int | None]:
+        """
+        Batch version of add_pending_request for one user's misses: one lookup
+        of equivalent requests and multi-row inserts. New requests share a
+        batch_id (the smallest new id). Returns ([(request_id, is_new)] in
+        input order, batch_id or None if nothing new was created).
+        """
+        normalized = [(sanitize_cyr(name), sanitize_ascii(name)) for name in celebrity_names]
+
+        async with acquire(self.pool) as conn:
+            async with conn.transaction():
+                await STATEMENTS.execute(conn, LOCK_PENDING_KEY, category, geo)
+                rows = await STATEMENTS.fetch(
+                    conn, FIND_EQUIVALENT_MANY, category, geo,
+                    [cyr for cyr, _ in normalized], [asc for _, asc in normalized],
+                )
+                existing = {row["ord"] - 1: row["id"] for row in rows if row["id"] is not None}
+
+                # одинаковые имена внутри пачки становятся одной заявкой
+                new_idx: list[int] = []
+                duplicate_of: dict[int, int] = {}
+                seen: dict[str, int] = {}
+                for idx, (cyr, asc) in enumerate(normalized):
+                    if idx in existing:
+                        continue
+                    first = seen.get(cyr, seen.get(asc))
+                    if first is not None:
+                        duplicate_of[idx] = first
+                        continue
+                    seen[cyr] = seen[asc] = idx
+                    new_idx.append(idx)
+
+                joined = sorted(set(existing.values()))
+                if joined:
+                    await STATEMENTS.execute(
+                        conn, ADD_REQUESTERS_MANY,
+                        joined, user_id, chat_id, message_id, bot_message_id, username
+                    )
+
+                created: dict[str, int] = {}
+                batch_id = None
+                if new_idx:
+                    inserted = await STATEMENTS.fetch(
+                        conn, ADD_PENDING_MANY,
+                        user_id, chat_id, message_id,
+                        [celebrity_names[i] for i in new_idx], category, geo,
+                        bot_message_id, username,
+                        [normalized[i][0] for i in new_idx], [normalized[i][1] for i in new_idx],
+                    )
+                    created = {row["normalized_name"]: row["id"] for row in inserted}
+                    batch_id = min(created.values())
+                    await STATEMENTS.execute(conn, SET_BATCH, batch_id, list(created.values()))
+
+        result: list[tuple[int, bool]] = []
+        for idx, (cyr, _) in enumerate(normalized):
+            if idx in existing:
+                result.append((existing[idx], False))
+            elif idx in duplicate_of:
+                result.append((created[normalized[duplicate_of[idx]][0]], False))
+            else:
+                result.append((created[cyr], True))
+        return result, batch_id
+
+    async def get_batch(self, batch_id: int) -> list:
+        """
+        Requests of a batch that are still pending.
+        """
+        async with acquire(self.pool) as conn:
+            return await STATEMENTS.fetch(conn, GET_BATCH, batch_id)
 
     async def pop_pending_request(self, request_id: int) -> dict | None:
-        async with self.pool.acquire() as conn:
-            return await conn.fetchrow(
-                """
-                DELETE FROM pending_requests
-                 WHERE id = $1
-                 RETURNING
-                   user_id,
-                   chat_id,
-                   message_id,
-                   celebrity_name,
-                   category,
-                   geo,
-                   bot_message_id, username
-                """,
-                request_id
-            )
+        async with acquire(self.pool) as conn:
+            return await STATEMENTS.fetchrow(conn, POP_PENDING, request_id)
+
+    async def pop_pending_request_with_messages(self, request_id: int) -> tuple[dict | None, list[dict]]:
+        """
+        Pops the request together with its staff messages. Messages are taken
+        first, in the same transaction, so a concurrent pop gets neither.
+        The returned request has "requesters": the author followed by everyone
+        who joined it.
+        """
+        async with bind_connection(self.pool, transaction=True) as conn:
+            messages = await self.messages.pop(request_id)
+            joined = await STATEMENTS.fetch(conn, POP_REQUESTERS, request_id)
+            pending = await self.pop_pending_request(request_id)
+        if pending is None:
+            return None, []
+
+        pending = dict(pending)
+        pending["requesters"] = [{k: pending[k] for k in REQUESTER_FIELDS}] + [
+            {k: row[k] for k in REQUESTER_FIELDS} for row in sorted(joined, key=lambda r: r["id"])
+        ]
+        return pending, messages
+
+    async def pop_pending_requests(self, request_ids: list[int]) -> tuple[list[dict], dict[int, list[dict]]]:
+        """
+        Set-based pop_pending_request_with_messages: pops every request that
+        still exists. Returns (requests ordered by id, {request_id: messages}).
+        """
+        request_ids = list(request_ids)
+        async with bind_connection(self.pool, transaction=True) as conn:
+            messages = await self.messages.pop_many(request_ids)
+            joined = await STATEMENTS.fetch(conn, POP_REQUESTERS_MANY, request_ids)
+            rows = await STATEMENTS.fetch(conn, POP_PENDING_MANY, request_ids)
+
+        joined_by_request: dict[int, list] = {}
+        for row in sorted(joined, key=lambda r: r["id"]):
+            joined_by_request.setdefault(row["request_id"], []).append({k: row[k] for k in REQUESTER_FIELDS})
+
+        pending = []
+        for row in sorted(rows, key=lambda r: r["id"]):
+            request = dict(row)
+            request["requesters"] = [{k: request[k] for k in REQUESTER_FIELDS}] + joined_by_request.get(row["id"], [])
+            pending.append(request)
+        popped = {request["id"] for request in pending}
+        return pending, {rid: msgs for rid, msgs in messages.items() if rid in popped}
+
+    async def get_pending_page(self, limit: int, cursor: tuple | None = None,
+                               direction: str = "from") -> tuple[list, bool, bool]:
+        """
+        One page of pending requests, oldest first, by keyset on (created_at, id).
+        direction: "from" - page starting at cursor, "next" - after it, "prev" - before it.
+        Returns (rows, has_prev, has_next).
+        """
+        async with acquire(self.pool) as conn:
+            if cursor is None:
+                rows = await STATEMENTS.fetch(conn, PAGE_FIRST, limit + 1)
+                return rows[:limit], False, len(rows) > limit
+
+            if direction == "prev":
+                rows = await STATEMENTS.fetch(conn, PAGE_BEFORE, *cursor, limit + 1)
+                if not rows:
+                    rows = await STATEMENTS.fetch(conn, PAGE_FIRST, limit + 1)
+                    return rows[:limit], False, len(rows) > limit
+                return list(reversed(rows[:limit])), len(rows) > limit, True
+
+            statement = PAGE_AFTER if direction == "next" else PAGE_FROM
+            rows = await STATEMENTS.fetch(conn, statement, *cursor, limit + 1)
+            if not rows and direction == "from":
+                # страница опустела - показываем предыдущую
+                rows = await STATEMENTS.fetch(conn, PAGE_BEFORE, *cursor, limit + 1)
+                return list(reversed(rows[:limit])), len(rows) > limit, False
+            return rows[:limit], True, len(rows) > limit
 
     async def get_all_pending_requests(self) -> list:
-        async with self.pool.acquire() as conn:
-            sql = """
-            SELECT id, celebrity_name, category, geo, username
-            FROM pending_requests
-            """
-            rows = await conn.fetch(sql)
-            return rows
\ No newline at end of file
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(conn, ALL_PENDING)
+            return rows
@@ -0,0 +1,51 @@
+import copy
+
+from cachetools import TTLCache
+
+import config
+
+
+UNIVERSAL_CATEGORY = 'все'
+_NOT_CACHED = object()
+
+
+class SearchCache:
+    """
+    Bounded TTL cache of find_celebrity results keyed on (cyr, ascii, category, geo).
+    Misses are cached too. Write paths invalidate every key of the touched geo/category.
+    """
+
+    def __init__(self, maxsize: int = config.SEARCH_CACHE_SIZE, ttl: int = config.SEARCH_CACHE_TTL):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, key: tuple) -> tuple[bool, object]:
+        """
+        Returns (hit, value). A cached miss is (True, None).
+        """
+        value = self._cache.get(key, _NOT_CACHED)
+        if value is _NOT_CACHED:
+            return False, None
+        return True, copy.deepcopy(value)
+
+    def set(self, key: tuple, value):
+        if not self._cache.maxsize:
+            # maxsize=0 — кэш выключен
+            return
+        self._cache[key] = copy.deepcopy(value)
+
+    def invalidate(self, geo: str | None, category: str | None):
+        """
+        Drops cached lookups that could see a row of the given geo/category.
+        A universal ('все') row is visible from every category of its geo.
+        """
+        loc = (geo or "").lower()
+        cat = (category or "").lower()
+        stale = [
+            key for key in list(self._cache.keys())
+            if key[3] == loc and (cat == UNIVERSAL_CATEGORY or key[2] == cat)
+        ]
+        for key in stale:
+            self._cache.pop(key, None)
+
+    def clear(self):
+        self._cache.clear()
@@ -1,14 +1,17 @@
 from aiogram import BaseMiddleware
 
+import config
 from db.celebrity_service import CelebrityService
+from db.connection import bind_connection
 from db.requests_service import RequestsService
 from db.subscribers_service import SubscribersService
 from command_manager import CommandManager
 
 
 class ServiceMiddleware(BaseMiddleware):
-    def __init__(self, pool):
+    def __init__(self, pool, connection_per_update: bool = config.DB_CONNECTION_PER_UPDATE):
         self.pool = pool
+        self.connection_per_update = connection_per_update
         self.celebrity_service = CelebrityService(pool)
         self.requests_service = RequestsService(pool)
         self.subscribers_service = SubscribersService(pool)
@@ -19,4 +22,11 @@ class ServiceMiddleware(BaseMiddleware):
         data['requests_service'] = self.requests_service
         data['subscribers_service'] = self.subscribers_service
         data['command_manager'] = self.command_manager
-        return await handler(event, data)
\ No newline at end of file
+        if not self.connection_per_update:
+            return await handler(event, data)
+
+        # одно соединение на весь апдейт, без общей транзакции: кэши, индекс и
+        # фоновые задачи обновляются сразу после каждого запроса, а хэндлер
+        # ходит в Telegram — держать транзакцию и локи всё это время нельзя
+        async with bind_connection(self.pool):
+            return await handler(event, data)
@@ -0,0 +1,60 @@
+from asyncpg import Connection
+from asyncpg.exceptions import PostgresError
+
+from config import logger
+
+
+class StatementRegistry:
+    """
+    Central registry of named SQL statements.
+
+    Services register their SQL at import time and execute it by name. The
+    pool's ``init`` callback prepares every registered statement on each new
+    connection, so asyncpg's per-connection statement cache is warm before the
+    first request and the same text is reused on every call.
+    """
+
+    def __init__(self):
+        self._sql: dict[str, str] = {}
+
+    def register(self, name: str, sql: str) -> str:
+        if name in self._sql and self._sql[name] != sql:
+            raise ValueError(f"Statement '{name}' is already registered with different SQL")
+        self._sql[name] = sql
+        return name
+
+    def __len__(self) -> int:
+        return len(self._sql)
+
+    async def prepare(self, conn: Connection):
+        """
+        Pool ``init`` callback: prepares every registered statement on a new connection.
+        """
+        prepared = 0
+        for name, sql in self._sql.items():
+            try:
+                # executemany с пустым списком только готовит запрос и кладёт его в кэш
+                # соединения. Parse без Sync держит неявную транзакцию с локами,
+                # поэтому оборачиваем в явную и сразу закрываем
+                async with conn.transaction():
+                    await conn.executemany(sql, [])
+                prepared += 1
+            except PostgresError as e:
+                # не валим пул: такой запрос подготовится при первом использовании
+                logger.warning(f"Failed to prepare statement '{name}': {e}")
+        logger.info(f"Prepared {prepared} statements for connection {conn.get_server_pid()}")
+
+    async def fetch(self, conn, name: str, *args) -> list:
+        return await conn.fetch(self._sql[name], *args)
+
+    async def fetchrow(self, conn, name: str, *args):
+        return await conn.fetchrow(self._sql[name], *args)
+
+    async def fetchval(self, conn, name: str, *args):
+        return await conn.fetchval(self._sql[name], *args)
+
+    async def execute(self, conn, name: str, *args) -> str:
+        return await conn.execute(self._sql[name], *args)
+
+
+STATEMENTS = StatementRegistry()
@@ -1,10 +1,73 @@
 from types import NoneType
 from typing import Optional
 
+from config import logger
+from db.connection import acquire
+from db.database_manager import RESYNC
+from db.statements import STATEMENTS
+
+
+ADD_SUBSCRIBER = STATEMENTS.register("subscribers.add", """
+    INSERT INTO subscribers(chat_id, username)
+    VALUES($1, $2)
+    ON CONFLICT (chat_id) DO UPDATE SET username = EXCLUDED.username
+    RETURNING role
+""")
+ALL_SUBSCRIBERS = STATEMENTS.register("subscribers.all", "SELECT chat_id, username FROM subscribers")
+GET_USER = STATEMENTS.register("subscribers.get", "SELECT * FROM subscribers WHERE chat_id = $1")
+UPDATE_ROLE = STATEMENTS.register(
+    "subscribers.update_role", "UPDATE subscribers SET role = $1 WHERE chat_id = $2 RETURNING role"
+)
+ALL_ROLES = STATEMENTS.register("subscribers.roles", "SELECT chat_id, role FROM subscribers")
+MODERATORS = STATEMENTS.register("subscribers.moderators", "SELECT chat_id FROM subscribers WHERE role = 'moderator'")
+OBSERVERS = STATEMENTS.register("subscribers.observers", "SELECT chat_id FROM subscribers WHERE role = 'observer'")
+
 
 class SubscribersService:
+    """
+    Subscribers storage with an in-process role map (chat_id -> role).
+    The map is loaded once at startup and kept in sync by add_subscriber and
+    update_role, so role checks on hot paths don't go to the database.
+    """
+
     def __init__(self, pool):
         self.pool = pool
+        self.roles_loaded = False
+        self._roles: dict[int, str] = {}
+
+
+    async def load_roles(self) -> int:
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(conn, ALL_ROLES)
+        self._roles = {row["chat_id"]: row["role"] for row in rows}
+        self.roles_loaded = True
+        logger.info(f"Subscriber roles loaded: {len(self._roles)} users")
+        return len(self._roles)
+
+
+    async def apply_change(self, event: dict):
+        """
+        Change feed handler (DatabaseManager.subscribe): role changes made by other processes.
+        """
+        if not self.roles_loaded:
+            return
+        if event["op"] == RESYNC:
+            await self.load_roles()
+        elif event["op"] == "DELETE":
+            self._roles.pop(event["chat_id"], None)
+        else:
+            self._roles[event["chat_id"]] = event["role"]
+
+
+    def has_role(self, chat_id: int, *roles: str) -> bool:
+        """
+        O(1) проверка роли по кэшу. До load_roles() всегда False.
+        """
+        return self._roles.get(chat_id) in roles
+
+
+    def _with_role(self, role: str) -> list[int]:
+        return [chat_id for chat_id, r in self._roles.items() if r == role]
 
 
     async def add_subscriber(self, chat_id: int, username: Optional[str] = None) -> int | None:
@@ -12,15 +75,9 @@ class SubscribersService:
         Сохраняет chat_id в таблице, если ещё нет.
         """
         try:
-            async with self.pool.acquire() as conn:
-                await conn.execute(
-                    """
-                    INSERT INTO subscribers(chat_id, username)
-                    VALUES($1, $2)
-                    ON CONFLICT (chat_id) DO UPDATE SET username = EXCLUDED.username
-                    """,
-                    chat_id, username
-                )
+            async with acquire(self.pool) as conn:
+                role = await STATEMENTS.fetchval(conn, ADD_SUBSCRIBER, chat_id, username)
+            self._roles[chat_id] = role
             return chat_id
         except Exception as e:
             return None
@@ -30,14 +87,14 @@ class SubscribersService:
         """
         Возвращает список всех chat_id из subscribers.
         """
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch("SELECT chat_id, username FROM subscribers")
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(conn, ALL_SUBSCRIBERS)
         return [{"chat_id": r["chat_id"], "username": r["username"]} for r in rows]
 
 
     async def get_user(self, chat_id: int) -> dict | None :
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM subscribers WHERE chat_id = $1", chat_id)
+        async with acquire(self.pool) as conn:
+            row = await STATEMENTS.fetchrow(conn, GET_USER, chat_id)
             if row:
                 return {"chat_id": row["chat_id"], "username": row["username"], "role": row["role"]}
             return None
@@ -45,29 +102,35 @@ class SubscribersService:
 
     async def update_role(self, chat_id: int, new_role: str) -> str | None:
         try:
-            async with self.pool.acquire() as conn:
-                sql = "UPDATE subscribers SET role = $1 WHERE chat_id = $2"
-                await conn.execute(sql, new_role, chat_id)
-
-                return new_role
+            async with acquire(self.pool) as conn:
+                role = await STATEMENTS.fetchval(conn, UPDATE_ROLE, new_role, chat_id)
+            if role is not None:
+                self._roles[chat_id] = role
+            return new_role
         except Exception as e:
             return None
 
 
     async def get_moderators(self) -> list[int]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch("SELECT chat_id FROM subscribers WHERE role = 'moderator'")
+        if self.roles_loaded:
+            return self._with_role('moderator')
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(conn, MODERATORS)
             return [row['chat_id'] for row in rows]
 
 
     async def get_observers(self) -> list[int]:
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch("SELECT chat_id FROM subscribers WHERE role = 'observer'")
+        if self.roles_loaded:
+            return self._with_role('observer')
+        async with acquire(self.pool) as conn:
+            rows = await STATEMENTS.fetch(conn, OBSERVERS)
             return [row['chat_id'] for row in rows]
 
     async def get_user_role(self, chat_id: int) -> str | None:
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow("SELECT * FROM subscribers WHERE chat_id = $1", chat_id)
+        if self.roles_loaded:
+            return self._roles.get(chat_id)
+        async with acquire(self.pool) as conn:
+            row = await STATEMENTS.fetchrow(conn, GET_USER, chat_id)
             if row:
                 return row["role"]
-            return None
\ No newline at end of file
+            return None
@@ -1,4 +1,7 @@
+import asyncio
+import html
 import re
+from datetime import datetime, timedelta
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramBadRequest
@@ -8,23 +11,22 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 from asyncpg import UniqueViolationError
 
 from command_manager import CommandManager
-from config import logger, ADMIN_ID
+from config import logger, ADMIN_ID, REQUESTS_PAGE_SIZE
 from db.celebrity_service import CelebrityService
 from db.requests_service import RequestsService
 from db.subscribers_service import SubscribersService
 from keyboards import get_new_search_button, get_edit_keyboard, get_categories_keyboard, get_geo_keyboard, \
-    cancel_role_change_kb
+    cancel_role_change_kb, get_bulk_moderation_keyboard
 from models import USER_ROLES
-from sheets_client import push_row, delete_row_by_id
-from sheets_sync import export_postgres_to_sheets
-from states import EditCelebrity, EditUserRole, ModeratingStates, Upload
+from rate_limiter import LIMITER, BULK
+from sheets_queue import SHEETS_QUEUE
+from sheets_reconcile import reconcile_sheet, format_report, has_changes
+from sheets_sync import export_celebrities_to_sheets, export_changes_to_sheets
+from states import EditCelebrity, EditUserRole, ModeratingStates, Upload, BulkModeration
 from synonyms import geo_synonyms
 from utils import is_moderator, replace_param_in_text, parse_celebrity_from_msg, set_subscriber_username
 
 
-PENDING_MESSAGES = {}
-
-
 async def edit_handler(call: CallbackQuery, state: FSMContext, subscribers_service: SubscribersService):
     user_id = call.from_user.id
 
@@ -133,7 +135,7 @@ async def name_or_reason_edited(message: Message, state: FSMContext, celebrity_s
     try:
         updated = await celebrity_service.update_celebrity(**celeb_data, **kwargs)
         if updated:
-            push_row(updated)
+            SHEETS_QUEUE.push_row(updated)
         else:
             await message.answer("❌ Ошибка при обновлении записи.")
 
@@ -178,7 +180,7 @@ async def new_param_chosen(call: CallbackQuery, state: FSMContext, celebrity_ser
     try:
         updated = await celebrity_service.update_celebrity(**celeb_data, **{param_to_use: new_value})
         if updated:
-            push_row(updated)
+            SHEETS_QUEUE.push_row(updated)
         elif updated is None:
             await call.answer("❌ Ошибка при обновлении записи.", show_alert=True)
             return
@@ -197,7 +199,7 @@ async def new_param_chosen(call: CallbackQuery, state: FSMContext, celebrity_ser
             if cat.lower() == 'все':
                 updated_others = await celebrity_service.sync_status_from_universal(geo, name, status)
                 for celeb in updated_others:
-                    push_row(celeb)
+                    SHEETS_QUEUE.push_row(celeb)
         if param_to_use == "new_cat":
             celeb_data["category"] = new_value
 
@@ -233,7 +235,7 @@ async def delete_celebrity_handler(call: CallbackQuery, state: FSMContext, celeb
 
     try:
         await celebrity_service.delete_celebrity(**celeb_data)
-        delete_row_by_id(rec_id)
+        SHEETS_QUEUE.delete_row(rec_id)
     except Exception as e:
         await call.message.answer("Ошибка при удалении записи в таблицах (нет id)")
         logger.error("Error deleting celebrity: ", e)
@@ -265,45 +267,109 @@ async def edit_back_button_handler(call: CallbackQuery, state: FSMContext):
 async def cmd_requests(message: Message, requests_service: RequestsService, subscribers_service: SubscribersService):
     await message.delete()
 
-    user_id = message.from_user.id
-    user_role = await subscribers_service.get_user_role(user_id)
-    requests = await requests_service.get_all_pending_requests()
-
-    if not requests:
+    user_role = await subscribers_service.get_user_role(message.from_user.id)
+    page = await render_requests_page(requests_service, user_role)
+    if page is None:
         await message.answer("Активных заявок нет.")
         return
 
-    for request in requests:
-        request_id, name, cat, geo, username = request[:5]
+    text, markup = page
+    await message.answer(text, reply_markup=markup, parse_mode="HTML")
 
-        text = (
-            f"<b>Необработанная заявка:</b>\n"
-            f"Имя: {name.title()}\n"
-            f"Категория: {cat.title()}\n"
-            f"Гео: {geo.title()}\n"
-            f"Номер Заявки: {request_id}\n"
-            f"Юзер: {'@'+username if username else ''}"
-        )
 
+EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(row) -> str:
+    return f"{(row['created_at'] - EPOCH) // timedelta(microseconds=1)}:{row['id']}"
+
+
+def decode_cursor(ts: str, request_id: str) -> tuple[datetime, int] | None:
+    if int(request_id) == 0:
+        return None
+    return EPOCH + timedelta(microseconds=int(ts)), int(request_id)
+
+
+async def render_requests_page(requests_service: RequestsService, user_role: str | None,
+                               cursor: tuple | None = None, direction: str = "from"):
+    """
+    Digest of pending requests: REQUESTS_PAGE_SIZE per message, keyset-paginated.
+    Returns (text, markup) or None if there are no pending requests.
+    """
+    rows, has_prev, has_next = await requests_service.get_pending_page(REQUESTS_PAGE_SIZE, cursor, direction)
+    if not rows:
+        return None
+
+    # начало страницы: по нему перерисовываем страницу после действия с заявкой
+    start = encode_cursor(rows[0]) if has_prev else "0:0"
+    lines = ["<b>Необработанные заявки:</b>", ""]
+    builder = InlineKeyboardBuilder()
+    sizes = []
+    for row in rows:
+        username = f"@{html.escape(row['username'])}" if row["username"] else ""
+        lines.append(
+            f"<b>{row['id']}</b>. {html.escape(row['celebrity_name'].title())} — "
+            f"{html.escape(row['category'].title())}, {html.escape(row['geo'].title())} {username}"
+        )
         if user_role != 'observer':
-            builder = InlineKeyboardBuilder()
-            builder.button(text="✅ Одобрить", callback_data=f"approve:{request_id}")
-            builder.button(text="⛔ Забанить", callback_data=f"ban:{request_id}")
-            builder.button(text="🗑 Удалить заявку", callback_data=f"delete:{request_id}")
-            builder.adjust(2, 1)
-            msg = await message.answer(text, reply_markup=builder.as_markup(), parse_mode="HTML")
-            PENDING_MESSAGES.setdefault(request_id, []).append({
-                "chat_id": msg.chat.id,
-                "message_id": msg.message_id
-            })
-        else:
-            await message.answer(text, parse_mode="HTML")
+            builder.button(text=f"✅ {row['id']}", callback_data=f"rq:a:{row['id']}:{start}")
+            builder.button(text=f"⛔ {row['id']}", callback_data=f"rq:b:{row['id']}:{start}")
+            builder.button(text=f"🗑 {row['id']}", callback_data=f"rq:d:{row['id']}:{start}")
+            sizes.append(3)
+
+    nav = 0
+    if has_prev:
+        builder.button(text="⬅️", callback_data=f"rq:p:{encode_cursor(rows[0])}")
+        nav += 1
+    if has_next:
+        builder.button(text="➡️", callback_data=f"rq:n:{encode_cursor(rows[-1])}")
+        nav += 1
+    if nav:
+        sizes.append(nav)
+    if user_role != 'observer':
+        builder.button(text="📋 Массовая модерация", callback_data="bulk:open")
+        sizes.append(1)
+    builder.adjust(*sizes)
+    return "\n".join(lines), builder.as_markup()
+
+
+async def requests_page_handler(call: CallbackQuery, state: FSMContext, requests_service: RequestsService,
+                                celebrity_service: CelebrityService, subscribers_service: SubscribersService):
+    _, action, *args = call.data.split(":")
+    user_role = await subscribers_service.get_user_role(call.from_user.id)
+
+    if action in ("n", "p"):
+        await call.answer()
+        page = await render_requests_page(
+            requests_service, user_role, decode_cursor(*args), "next" if action == "n" else "prev"
+        )
+    else:
+        if user_role == 'observer':
+            await call.answer("❌ У вас нет прав для этой команды.", show_alert=True)
+            return
+        req_id, cursor = int(args[0]), decode_cursor(*args[1:])
+        if action == "d":
+            pending, _ = await requests_service.pop_pending_request_with_messages(req_id)
+            await call.answer("Заявка удалена" if pending else "Заявка не найдена или уже обработана")
+        elif await moderate_request(call, "approve" if action == "a" else "ban", req_id,
+                                    requests_service, celebrity_service, state):
+            await call.answer()
+        page = await render_requests_page(requests_service, user_role, cursor)
+
+    if page is None:
+        await call.message.edit_text("Активных заявок нет.")
+        return
+    text, markup = page
+    try:
+        await call.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
+    except TelegramBadRequest:
+        pass
 
 
 async def delete_request_handler(call: CallbackQuery, requests_service: RequestsService):
     await call.message.delete()
     request_id = call.data.split(":", 1)[1]
-    await requests_service.pop_pending_request(int(request_id))
+    await requests_service.pop_pending_request_with_messages(int(request_id))
     await call.answer(text="Заявка удалена")
 
 
@@ -311,12 +377,14 @@ async def send_request_to_moderator(name_input: str, category: str, geo: str, pr
     moderators = await subscribers_service.get_moderators()
     observers = await subscribers_service.get_observers()
     moderators.append(ADMIN_ID)
-    msg_ids = []
 
-    request_id = await requests_service.add_pending_request(
+    request_id, is_new = await requests_service.add_pending_request(
         message.from_user.id, message.chat.id, message.message_id,
         name_input, category, geo, prompt_id, username
     )
+    if not is_new:
+        # такая заявка уже ждёт модератора: юзер получит ответ вместе с остальными
+        return request_id
 
     text = (
         f"<b>Новая заявка:</b>\n\n"
@@ -332,48 +400,216 @@ async def send_request_to_moderator(name_input: str, category: str, geo: str, pr
     builder.button(text="⛔ Забанить", callback_data=f"ban:{request_id}")
     builder.adjust(2)
 
-    for mod_id in moderators:
-        try:
-            msg = await message.bot.send_message(
-                chat_id=mod_id,
-                text=text,
-                reply_markup=builder.as_markup(),
-                parse_mode="HTML"
-            )
-            msg_ids.append({"chat_id": mod_id, "message_id": msg.message_id})
-
-        except Exception as e:
-            logger.warning("Failed to send message to moderator, ID: {mod_id}", exc_info=e)
-
-    for ob_id in observers:
-        try:
-            msg = await message.bot.send_message(
-                chat_id=ob_id,
-                text=text,
-                parse_mode="HTML"
-            )
-            msg_ids.append({"chat_id": ob_id, "message_id": msg.message_id})
+    # юзер получает ответ сразу, модераторы уведомляются в фоне
+    LIMITER.spawn(notify_staff(
+        message.bot, request_id, text, builder.as_markup(), moderators, observers, requests_service.messages
+    ))
 
-        except Exception as e:
-            logger.warning("Failed to send message to observer", exc_info=e)
+    return request_id
 
-    PENDING_MESSAGES[request_id] = msg_ids
 
-    return request_id
+async def notify_staff(bot: Bot, request_id: int, text: str, markup, moderators: list[int], observers: list[int],
+                       messages_store):
+    moderators = list(dict.fromkeys(moderators))
+    observers = [ob_id for ob_id in dict.fromkeys(observers) if ob_id not in moderators]
+
+    async def send(chat_id: int):
+        msg = await bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            reply_markup=markup if chat_id in moderators else None,
+            parse_mode="HTML"
+        )
+        stored = await messages_store.add(request_id, [{
+            "chat_id": chat_id, "message_id": msg.message_id, "with_actions": chat_id in moderators,
+        }])
+        if not stored:
+            # заявку обработали, пока шла рассылка
+            logger.info(f"Request {request_id} was resolved before message to {chat_id} was stored")
+        return msg
+
+    results = await LIMITER.fan_out(moderators + observers, send)
+    for chat_id, result in results.items():
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to send request {request_id} to staff member, ID: {chat_id}", exc_info=result)
+
+
+def processed_request_text(data: dict) -> str:
+    lines = [
+        "<b>Заявка обработана:</b>\n",
+        f"Имя: {data['name'].title()}",
+        f"Категория: {data['category'].title()}",
+        f"Гео: {data['geo'].title()}",
+    ]
+    if data["status"] == "нельзя использовать":
+        lines.append(f"Статус: {data['status'].title()} ⛔")
+        lines.append(f"Причина: {data['reason']}")
+    else:
+        lines.append(f"Статус: {data['status'].title()}")
+    lines.append(f"Номер Заявки: {data['req_id']}\nЮзер: @{data['username']}")
+    lines.append("<b>Статус и данные по селебе занесены в БД</b>")
+    return "\n".join(lines)
+
+
+async def edit_pending_messages(bot: Bot, message_ids: list[dict], text: str, requests_service: RequestsService):
+    # сообщения с пачкой заявок перерисовываются целиком, остальные получают text
+    batch_messages = [m for m in message_ids if m.get("batch_id")]
+    message_ids = [m for m in message_ids if not m.get("batch_id")]
+    if batch_messages:
+        await edit_batch_messages(bot, batch_messages, requests_service)
+
+    async def edit(msg_info: dict):
+        return await bot.edit_message_text(
+            chat_id=msg_info["chat_id"],
+            message_id=msg_info["message_id"],
+            text=text,
+            parse_mode="HTML",
+        )
+
+    results = await asyncio.gather(*(edit(msg_info) for msg_info in message_ids), return_exceptions=True)
+    for msg_info, result in zip(message_ids, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to edit request message {msg_info}", exc_info=result)
+
+
+async def edit_batch_messages(bot: Bot, message_ids: list[dict], requests_service: RequestsService):
+    unique = {(m["chat_id"], m["message_id"]): m for m in message_ids}.values()
+    batches = {}
+    for batch_id in {m["batch_id"] for m in unique}:
+        batches[batch_id] = await requests_service.get_batch(batch_id)
+
+    async def edit(msg_info: dict):
+        text, markup = render_batch_message(msg_info["batch_id"], batches[msg_info["batch_id"]], msg_info["with_actions"])
+        return await bot.edit_message_text(
+            chat_id=msg_info["chat_id"],
+            message_id=msg_info["message_id"],
+            text=text,
+            reply_markup=markup,
+            parse_mode="HTML",
+        )
+
+    unique = list(unique)
+    results = await asyncio.gather(*(edit(msg_info) for msg_info in unique), return_exceptions=True)
+    for msg_info, result in zip(unique, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to edit batch message {msg_info}", exc_info=result)
+
+
+BATCH_MESSAGE_SIZE = 30
+
+
+def render_batch_message(batch_id: int, rows: list, with_actions: bool = True):
+    """
+    Grouped staff message for the still pending requests of a batch.
+    """
+    if not rows:
+        return "<b>Заявки из массового поиска обработаны</b>", None
+
+    first = rows[0]
+    lines = [
+        f"<b>Новые заявки (массовый поиск): {len(rows)}</b>\n",
+        f"Категория: {html.escape(first['category'].title())}",
+        f"Гео: {html.escape(first['geo'].title())}",
+        f"Юзер: @{html.escape(first['username'] or '')}",
+        "",
+    ]
+    builder = InlineKeyboardBuilder()
+    for row in rows:
+        lines.append(f"<b>{row['id']}</b>. {html.escape(row['celebrity_name'].title())}")
+        builder.button(text=f"✅ {row['id']}", callback_data=f"bq:a:{row['id']}:{batch_id}")
+        builder.button(text=f"⛔ {row['id']}", callback_data=f"bq:b:{row['id']}:{batch_id}")
+    builder.adjust(2)
+    return "\n".join(lines), builder.as_markup() if with_actions else None
+
+
+async def send_batch_request_to_moderator(names: list[str], category: str, geo: str, prompt_id: int, username: str,
+                                          message: Message, requests_service: RequestsService,
+                                          subscribers_service: SubscribersService) -> list[int]:
+    """
+    Submits all misses of a batch search at once: one multi-row insert and one
+    grouped staff message per BATCH_MESSAGE_SIZE names. Returns request ids in order.
+    """
+    moderators = await subscribers_service.get_moderators()
+    observers = await subscribers_service.get_observers()
+    moderators.append(ADMIN_ID)
+
+    request_ids = []
+    for start in range(0, len(names), BATCH_MESSAGE_SIZE):
+        added, batch_id = await requests_service.add_pending_requests(
+            message.from_user.id, message.chat.id, message.message_id,
+            names[start:start + BATCH_MESSAGE_SIZE], category, geo, prompt_id, username
+        )
+        request_ids.extend(request_id for request_id, _ in added)
+        if batch_id is not None:
+            LIMITER.spawn(notify_batch_staff(
+                message.bot, batch_id, moderators, observers, requests_service
+            ))
+    return request_ids
+
+
+async def notify_batch_staff(bot: Bot, batch_id: int, moderators: list[int], observers: list[int],
+                             requests_service: RequestsService):
+    moderators = list(dict.fromkeys(moderators))
+    observers = [ob_id for ob_id in dict.fromkeys(observers) if ob_id not in moderators]
+    rows = await requests_service.get_batch(batch_id)
+    if not rows:
+        return
+
+    async def send(chat_id: int):
+        with_actions = chat_id in moderators
+        text, markup = render_batch_message(batch_id, rows, with_actions)
+        msg = await bot.send_message(chat_id=chat_id, text=text, reply_markup=markup, parse_mode="HTML")
+        # одно сообщение привязано ко всем заявкам пачки
+        stored = await requests_service.messages.add_many([
+            (row["id"], {"chat_id": chat_id, "message_id": msg.message_id,
+                         "batch_id": batch_id, "with_actions": with_actions})
+            for row in rows
+        ])
+        if not stored:
+            logger.info(f"Part of batch {batch_id} was resolved before message to {chat_id} was stored")
+        return msg
+
+    results = await LIMITER.fan_out(moderators + observers, send)
+    for chat_id, result in results.items():
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to send batch {batch_id} to staff member, ID: {chat_id}", exc_info=result)
+
+
+async def batch_item_handler(call: CallbackQuery, state: FSMContext, requests_service: RequestsService,
+                             celebrity_service: CelebrityService):
+    _, action, req_id, batch_id = call.data.split(":")
+    if not await moderate_request(call, "approve" if action == "a" else "ban", int(req_id),
+                                  requests_service, celebrity_service, state):
+        # заявку уже обработали - просто перерисовываем пачку
+        text, markup = render_batch_message(int(batch_id), await requests_service.get_batch(int(batch_id)))
+        try:
+            await call.message.edit_text(text, reply_markup=markup, parse_mode="HTML")
+        except TelegramBadRequest:
+            pass
+        return
+    await call.answer()
 
 
 async def handle_request_moderator(call, requests_service: RequestsService, celebrity_service: CelebrityService, state:FSMContext):
     action, req_id = call.data.split(":", 1)
-    is_approve = (action == "approve")
-
-    pending = await requests_service.pop_pending_request(int(req_id))
-    if not pending:
-        await call.answer("Заявка не найдена или уже обработана", show_alert=True)
+    if not await moderate_request(call, action, int(req_id), requests_service, celebrity_service, state):
         try:
             await call.message.delete()
         except TelegramBadRequest:
             pass
-        return
+
+
+async def moderate_request(call: CallbackQuery, action: str, req_id: int, requests_service: RequestsService,
+                           celebrity_service: CelebrityService, state: FSMContext) -> bool:
+    """
+    Approves or starts banning a request. Returns False if it is already gone.
+    """
+    is_approve = (action == "approve")
+
+    pending, pending_messages = await requests_service.pop_pending_request_with_messages(req_id)
+    if not pending:
+        await call.answer("Заявка не найдена или уже обработана", show_alert=True)
+        return False
 
     data = {
         "chat_id": pending["chat_id"],
@@ -386,6 +622,8 @@ async def handle_request_moderator(call, requests_service: RequestsService, cele
         "status":   "согласована" if is_approve else "нельзя использовать",
         "req_id":   int(req_id),
         "reason":   None,
+        "pending_messages": pending_messages,
+        "requesters": pending["requesters"],
     }
 
     if not is_approve:
@@ -393,7 +631,7 @@ async def handle_request_moderator(call, requests_service: RequestsService, cele
         await state.update_data(**data)
         msg = await call.bot.send_message(chat_id=call.message.chat.id, text="⛔ Укажите причину, почему нельзя использовать:")
         await state.update_data(reason_prompt_msg_id=msg.message_id)
-        return
+        return True
 
     inserted = await celebrity_service.insert_celebrity(data["name"], data["category"], data["geo"], data["status"])
     data["inserted"] = inserted
@@ -402,36 +640,19 @@ async def handle_request_moderator(call, requests_service: RequestsService, cele
         updated = await celebrity_service.sync_status_from_universal(data["geo"], data["name"], data["status"])
         data["synced"] = updated
         for celeb in updated:
-            push_row(celeb)
+            SHEETS_QUEUE.push_row(celeb)
 
-    push_row(inserted)
+    SHEETS_QUEUE.push_row(inserted)
 
-    message_ids = PENDING_MESSAGES.get(int(req_id), [])
-    for msg_info in message_ids:
-        try:
-            await call.bot.edit_message_text(
-                chat_id=msg_info["chat_id"],
-                message_id=msg_info["message_id"],
-                text=f"<b>Заявка обработана:</b>\n\n"
-                     f"Имя: {data["name"].title()}\n"
-                     f"Категория: {data["category"].title()}\n"
-                     f"Гео: {data["geo"].title()}\n"
-                     f"Статус: {data["status"].title()}\n"
-                     f"Номер Заявки: {data["req_id"]}\nЮзер: @{data["username"]}\n"
-                     f"<b>Статус и данные по селебе занесены в БД</b>",
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.warning(f"Failed to edit request message {msg_info}", exc_info=e)
-
-    if int(req_id) in PENDING_MESSAGES:
-        del PENDING_MESSAGES[int(req_id)]
-
-    await callback_handler(data=data, state=state, bot=call.bot)
+    LIMITER.spawn(edit_pending_messages(call.bot, pending_messages, processed_request_text(data), requests_service))
+
+    await notify_requesters(data, state, call.bot)
     await state.clear()
+    return True
 
 
-async def process_reason(message: Message, state: FSMContext, celebrity_service: CelebrityService):
+async def process_reason(message: Message, state: FSMContext, celebrity_service: CelebrityService,
+                         requests_service: RequestsService):
     reason = message.text.strip()
     data = await state.get_data()
     data.update(reason=reason)
@@ -454,34 +675,43 @@ async def process_reason(message: Message, state: FSMContext, celebrity_service:
         updated = await celebrity_service.sync_status_from_universal(data["geo"], data["name"], data["status"], reason)
         data["synced"] = updated
         for row in updated:
-            push_row(row)
-    push_row(inserted)
+            SHEETS_QUEUE.push_row(row)
+    SHEETS_QUEUE.push_row(inserted)
 
-    for msg_info in PENDING_MESSAGES.get(data["req_id"], []):
-        try:
-            await message.bot.edit_message_text(
-                chat_id=msg_info["chat_id"],
-                message_id=msg_info["message_id"],
-                text=f"<b>Заявка обработана:</b>\n\n"
-                     f"Имя: {data["name"].title()}\n"
-                     f"Категория: {data["category"].title()}\n"
-                     f"Гео: {data["geo"].title()}\n"
-                     f"Статус: {data["status"].title()} ⛔\n"
-                     f"Причина: {reason}\n"
-                     f"Номер Заявки: {data["req_id"]}\nЮзер: @{data["username"]}\n"
-                     f"<b>Статус и данные по селебе занесены в БД</b>",
-                parse_mode="HTML",
-            )
-        except Exception as e:
-            logger.warning(f"Failed to edit request message {msg_info}", exc_info=e)
-
-    PENDING_MESSAGES.pop(data["req_id"], None)
+    LIMITER.spawn(edit_pending_messages(
+        message.bot, data.get("pending_messages", []), processed_request_text(data), requests_service
+    ))
 
     await message.answer("❌ Причина добавлена, селеба занесена.")
-    await callback_handler(data=data, state=state, bot=message.bot)
+    await notify_requesters(data, state, message.bot)
     await state.clear()
 
 
+async def notify_requesters(data: dict, state: FSMContext, bot: Bot):
+    """
+    Sends the moderator's decision to everyone waiting on the request.
+    """
+    requesters = data.get("requesters") or [{
+        "chat_id": data["chat_id"], "message_id": data["message_id"], "bot_message_id": data.get("prompt_id"),
+    }]
+
+    async def notify(requester: dict):
+        await callback_handler(data={
+            **data,
+            "chat_id": requester["chat_id"],
+            "message_id": requester["message_id"],
+            "prompt_id": requester["bot_message_id"],
+        }, state=state, bot=bot)
+
+    results = await asyncio.gather(
+        *(notify(r) for r in requesters),
+        return_exceptions=True,
+    )
+    for requester, result in zip(requesters, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Failed to notify requester {requester['chat_id']}", exc_info=result)
+
+
 async def callback_handler(data: dict, state: FSMContext=None, bot: Bot = None):
     name = data["name"]
     category = data["category"]
@@ -504,7 +734,8 @@ async def callback_handler(data: dict, state: FSMContext=None, bot: Bot = None):
         show_celebs = True
         text.append(f"Причина: {reason}")
         text.append("\nВы можете ознакомиться с доступным списком селеб по данному гео/категории:")
-        await state.update_data(geo=geo, cat=category)
+        if state is not None:
+            await state.update_data(geo=geo, cat=category)
 
     kb = get_new_search_button(show_celebs=show_celebs or False)
     text = "\n".join(text)
@@ -674,22 +905,121 @@ async def cmd_upload(message: Message, state: FSMContext):
     await state.clear()
     await message.delete()
     kb = InlineKeyboardBuilder()
-    kb.button(text="✅ Подтвердить", callback_data="confirm_upload")
+    kb.button(text="✅ Только изменения", callback_data="confirm_upload")
+    kb.button(text="♻️ Полная перезапись", callback_data="confirm_upload:full")
     kb.button(text="❌ Отмена", callback_data="cancel_upload")
-    await message.answer("Эта команда обновит гугл таблицу и заменит ее строками из базы данных бота.\n"
+    kb.adjust(1)
+    await message.answer("Эта команда обновит гугл таблицу строками из базы данных бота.\n"
+                         "«Только изменения» выгрузит строки, изменённые с прошлой выгрузки, "
+                         "«Полная перезапись» заменит всю таблицу.\n"
                          "Подтверждаете выгрузку?", reply_markup=kb.as_markup())
 
-async def upload_confirmed(call: CallbackQuery):
+_export_lock = asyncio.Lock()
+
+
+async def _claim_export_lock() -> bool:
+    """
+    Takes _export_lock for a background job, or returns False if it is busy.
+    The job releases the lock when it ends.
+    """
+    if _export_lock.locked():
+        return False
+    # свободный Lock захватывается без переключения задач — второе нажатие уже увидит его занятым
+    await _export_lock.acquire()
+    return True
+
+
+async def upload_confirmed(call: CallbackQuery, celebrity_service: CelebrityService):
     await call.answer()
-    await call.message.answer("Начинаю выгрузку....")
-    await call.message.delete()
+    if not await _claim_export_lock():
+        await call.message.delete()
+        await call.message.answer("Выгрузка уже идёт, дождитесь её завершения.")
+        return
+    full = call.data == "confirm_upload:full"
     try:
-        exported = export_postgres_to_sheets()
-        if exported is not None:
-            await call.message.answer(f"✅БД синхронизирована: {exported} строк.")
-            return
-    except Exception:
-        await call.message.answer("❌ Ошибка синхронизации данных.")
+        await call.message.delete()
+        progress_msg = await call.message.answer("Начинаю выгрузку....")
+    except BaseException:
+        _export_lock.release()
+        raise
+    # выгрузка долгая — идёт в фоне, бот продолжает отвечать остальным
+    LIMITER.spawn(run_export(call.bot, progress_msg.chat.id, progress_msg.message_id, celebrity_service, full))
+
+
+async def run_export(bot: Bot, chat_id: int, message_id: int, celebrity_service: CelebrityService,
+                     full: bool = False):
+    async def progress(done: int, total: int):
+        try:
+            await bot.edit_message_text(text=f"Выгрузка... {done} из {total} строк.",
+                                        chat_id=chat_id, message_id=message_id)
+        except TelegramBadRequest:
+            pass
+
+    # _export_lock захвачен в upload_confirmed
+    try:
+        if full:
+            exported = await export_celebrities_to_sheets(celebrity_service, progress)
+        else:
+            exported = await export_changes_to_sheets(celebrity_service, progress)
+    except Exception as e:
+        logger.error("Export to sheets failed", exc_info=e)
+        await bot.edit_message_text(text="❌ Ошибка синхронизации данных.", chat_id=chat_id, message_id=message_id)
+        return
+    finally:
+        _export_lock.release()
+    await bot.edit_message_text(text=f"✅БД синхронизирована: {exported} строк.", chat_id=chat_id, message_id=message_id)
+
+
+async def cmd_reconcile(message: Message, celebrity_service: CelebrityService):
+    if not await _claim_export_lock():
+        await message.answer("Идёт выгрузка в таблицу, повторите позже.")
+        return
+    try:
+        msg = await message.answer("Сверяю таблицу с базой данных...")
+    except BaseException:
+        _export_lock.release()
+        raise
+    LIMITER.spawn(run_reconcile(message.bot, msg.chat.id, msg.message_id, celebrity_service, apply=False))
+
+
+async def reconcile_handler(call: CallbackQuery, celebrity_service: CelebrityService):
+    await call.answer()
+    if call.data == "reconcile:cancel":
+        await call.message.delete()
+        return
+    if not await _claim_export_lock():
+        await call.message.answer("Идёт выгрузка в таблицу, повторите позже.")
+        return
+    try:
+        await call.message.edit_text("Исправляю расхождения...")
+    except BaseException:
+        _export_lock.release()
+        raise
+    LIMITER.spawn(run_reconcile(call.bot, call.message.chat.id, call.message.message_id, celebrity_service, apply=True))
+
+
+async def run_reconcile(bot: Bot, chat_id: int, message_id: int, celebrity_service: CelebrityService, apply: bool):
+    # _export_lock захвачен в cmd_reconcile / reconcile_handler
+    try:
+        plan = await reconcile_sheet(celebrity_service, apply=apply)
+    except Exception as e:
+        logger.error("Sheet reconcile failed", exc_info=e)
+        await bot.edit_message_text(text="❌ Ошибка сверки с таблицей.", chat_id=chat_id, message_id=message_id)
+        return
+    finally:
+        _export_lock.release()
+
+    report = format_report(plan)
+    if apply:
+        await bot.edit_message_text(text=f"✅ Таблица исправлена.\n{report}", chat_id=chat_id, message_id=message_id)
+        return
+    if not has_changes(plan):
+        await bot.edit_message_text(text=f"✅ Расхождений нет.\n{report}", chat_id=chat_id, message_id=message_id)
+        return
+    kb = InlineKeyboardBuilder()
+    kb.button(text="✅ Исправить", callback_data="reconcile:apply")
+    kb.button(text="❌ Закрыть", callback_data="reconcile:cancel")
+    await bot.edit_message_text(text=report, chat_id=chat_id, message_id=message_id, reply_markup=kb.as_markup())
 
 
 async def upload_cancelled(call: CallbackQuery, state: FSMContext):
@@ -697,3 +1027,151 @@ async def upload_cancelled(call: CallbackQuery, state: FSMContext):
     await call.message.delete()
     await state.clear()
 
+
+BULK_PAGE_SIZE = 10
+
+
+def render_bulk_selection(data: dict):
+    requests = data["bulk_requests"]
+    selected = set(data["bulk_selected"])
+    pages = max(1, (len(requests) + BULK_PAGE_SIZE - 1) // BULK_PAGE_SIZE)
+    page = min(max(data.get("bulk_page", 0), 0), pages - 1)
+    page_requests = requests[page * BULK_PAGE_SIZE:(page + 1) * BULK_PAGE_SIZE]
+
+    lines = [f"Массовая модерация. Выбрано: {len(selected)} из {len(requests)}", ""]
+    for request_id, name, cat, geo in page_requests:
+        lines.append(f"{request_id}. {name.title()} — {cat.title()}, {geo.title()}")
+    kb = get_bulk_moderation_keyboard(page_requests, selected, page, pages)
+    return "\n".join(lines), kb.as_markup()
+
+
+async def bulk_open_handler(call: CallbackQuery, state: FSMContext, requests_service: RequestsService):
+    requests = await requests_service.get_all_pending_requests()
+    if not requests:
+        await call.answer("Активных заявок нет.", show_alert=True)
+        return
+
+    await call.answer()
+    await state.set_state(BulkModeration.selecting)
+    await state.update_data(
+        bulk_requests=[[r["id"], r["celebrity_name"], r["category"], r["geo"]] for r in requests],
+        bulk_selected=[],
+        bulk_page=0,
+    )
+    text, markup = render_bulk_selection(await state.get_data())
+    await call.message.answer(text, reply_markup=markup)
+
+
+async def bulk_selection_handler(call: CallbackQuery, state: FSMContext, requests_service: RequestsService,
+                                 celebrity_service: CelebrityService):
+    _, action, *arg = call.data.split(":")
+    data = await state.get_data()
+    selected = set(data.get("bulk_selected", []))
+    all_ids = [r[0] for r in data.get("bulk_requests", [])]
+
+    if action == "cancel":
+        await state.clear()
+        await call.message.delete()
+        await call.answer()
+        return
+
+    if action in ("approve", "ban"):
+        if not selected:
+            await call.answer("Ничего не выбрано", show_alert=True)
+            return
+        await call.answer()
+        if action == "ban":
+            await state.set_state(BulkModeration.awaiting_reason)
+            msg = await call.message.answer(f"⛔ Укажите причину для выбранных заявок ({len(selected)}):")
+            await state.update_data(reason_prompt_msg_id=msg.message_id)
+            return
+        processed = await apply_bulk_decision(
+            call.bot, sorted(selected), "согласована", None, requests_service, celebrity_service
+        )
+        await state.clear()
+        await call.message.edit_text(f"✅ Одобрено заявок: {processed} из {len(selected)}")
+        return
+
+    if action == "toggle":
+        request_id = int(arg[0])
+        selected.symmetric_difference_update({request_id})
+    elif action == "all":
+        selected = set() if selected >= set(all_ids) else set(all_ids)
+    elif action == "page":
+        data["bulk_page"] = int(arg[0])
+
+    data["bulk_selected"] = sorted(selected)
+    await state.update_data(bulk_selected=data["bulk_selected"], bulk_page=data.get("bulk_page", 0))
+    text, markup = render_bulk_selection(data)
+    try:
+        await call.message.edit_text(text, reply_markup=markup)
+    except TelegramBadRequest:
+        pass
+    await call.answer()
+
+
+async def bulk_reason_handler(message: Message, state: FSMContext, requests_service: RequestsService,
+                              celebrity_service: CelebrityService):
+    reason = message.text.strip()
+    data = await state.get_data()
+    reason_msg_id = data.get("reason_prompt_msg_id")
+    if reason_msg_id:
+        try:
+            await message.bot.delete_message(chat_id=message.chat.id, message_id=reason_msg_id)
+        except TelegramBadRequest:
+            pass
+
+    selected = data.get("bulk_selected", [])
+    processed = await apply_bulk_decision(
+        message.bot, selected, "нельзя использовать", reason, requests_service, celebrity_service
+    )
+    await state.clear()
+    await message.answer(f"⛔ Забанено заявок: {processed} из {len(selected)}")
+
+
+async def apply_bulk_decision(bot: Bot, request_ids: list[int], status: str, reason: str | None,
+                              requests_service: RequestsService, celebrity_service: CelebrityService) -> int:
+    """
+    Applies one decision to many requests: one set-based pop, one multi-row
+    upsert and one Sheets batch. Staff edits and requester notifications go
+    out in the background. Returns the number of requests actually processed.
+    """
+    pending, messages = await requests_service.pop_pending_requests(request_ids)
+    if not pending:
+        return 0
+
+    records = [{
+        "name": p["celebrity_name"].lower(),
+        "category": p["category"].lower(),
+        "geo": p["geo"].lower(),
+        "status": status,
+        "reason": reason,
+    } for p in pending]
+    rows = await celebrity_service.insert_celebrities(records)
+
+    for record in records:
+        if record["category"] == 'все':
+            rows += await celebrity_service.sync_status_from_universal(record["geo"], record["name"], status, reason)
+
+    SHEETS_QUEUE.push_rows(rows)
+
+    # сообщения с пачками заявок перерисовываем один раз на все заявки
+    batch_messages = [m for msgs in messages.values() for m in msgs if m.get("batch_id")]
+    if batch_messages:
+        LIMITER.spawn(edit_batch_messages(bot, batch_messages, requests_service), BULK)
+
+    for p, record in zip(pending, records):
+        data = {
+            **record,
+            "chat_id": p["chat_id"],
+            "message_id": p["message_id"],
+            "prompt_id": p["bot_message_id"],
+            "username": p["username"],
+            "req_id": p["id"],
+            "requesters": p["requesters"],
+        }
+        single_messages = [m for m in messages.get(p["id"], []) if not m.get("batch_id")]
+        LIMITER.spawn(edit_pending_messages(bot, single_messages, processed_request_text(data), requests_service), BULK)
+        LIMITER.spawn(notify_requesters(data, None, bot), BULK)
+
+    return len(pending)
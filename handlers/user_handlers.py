@@ -9,8 +9,8 @@ from command_manager import CommandManager
 from db.celebrity_service import CelebrityService
 from db.requests_service import RequestsService
 from db.subscribers_service import SubscribersService
-from handlers.moderator_handlers import send_request_to_moderator
-from keyboards import get_new_search_button, get_geo_keyboard, get_categories_keyboard
+from handlers.moderator_handlers import send_request_to_moderator, send_batch_request_to_moderator
+from keyboards import get_new_search_button, get_geo_keyboard, get_categories_keyboard, get_listing_page_keyboard
 from states import SearchMenu
 
 from synonyms import category_synonyms, geo_synonyms
@@ -177,32 +177,32 @@ async def handle_all_categories(name_input: str, geo: str, message: types.Messag
     check_other_cats = True
     show_edit_button = False
 
-    for cat in categories:
-        if cat == 'все':
-            matched = await celebrity_service.find_celebrity(name_input, cat, geo)
-            if matched:
-                celeb = matched[0] if isinstance(matched, list) else matched
-                status = celeb["status"]
-                text = build_card_text(celeb)
-                if status == 'нельзя использовать':
-                    text += "\nВы можете ознакомиться с доступным списком селеб по данному гео/категории:"
-                    show_celebs = True
-                    celeb_id = celeb["id"]
-                    await state.update_data(geo=geo, cat=cat, celeb_id=celeb_id)
-
-                check_other_cats = False
-                show_edit_button = True
-            else:
-                req_id = await send_request_to_moderator(name_input, cat, geo, prompt_id, username, message, requests_service,
-                                                subscribers_service)
-        if check_other_cats:
-            matched = await celebrity_service.find_celebrity(name_input, cat, geo)
-            if matched:
-                status = matched["status"] if isinstance(matched, dict) else matched[0]["status"]
-                if status == 'согласована':
-                    approved.append(cat)
-                elif status == 'нельзя использовать':
-                    banned.append(cat)
+    matches = await celebrity_service.find_celebrity_all_categories(name_input, geo)
+    universal = matches.get('все')
+    if universal:
+        cat = 'все'
+        status = universal["status"]
+        text = build_card_text(universal)
+        if status == 'нельзя использовать':
+            text += "\nВы можете ознакомиться с доступным списком селеб по данному гео/категории:"
+            show_celebs = True
+            celeb_id = universal["id"]
+            await state.update_data(geo=geo, cat=cat, celeb_id=celeb_id)
+
+        check_other_cats = False
+        show_edit_button = True
+    else:
+        req_id = await send_request_to_moderator(name_input, 'все', geo, prompt_id, username, message, requests_service,
+                                                 subscribers_service)
+        for cat in categories:
+            matched = matches.get(cat)
+            if cat == 'все' or not matched:
+                continue
+            status = matched["status"]
+            if status == 'согласована':
+                approved.append(cat)
+            elif status == 'нельзя использовать':
+                banned.append(cat)
     if check_other_cats:
         if len(approved) == len(categories) - 1:
             lines.append("Согласована✅ по всем категориям")
@@ -236,8 +236,8 @@ async def handle_batch_request(names: list, category: str, geo: str, message: ty
     batch_similar_map: dict[int, list[dict]] = {}
     data = await state.get_data()
 
-    for idx, name in enumerate(names):
-        matched = await celebrity_service.find_celebrity(name, category, geo)
+    results = await celebrity_service.find_celebrities_batch(names, category, geo)
+    for idx, (name, matched) in enumerate(zip(names, results)):
         if isinstance(matched, dict):
             found.append({"query": name, "rec": matched})
         elif isinstance(matched, list):
@@ -261,14 +261,16 @@ async def handle_batch_request(names: list, category: str, geo: str, message: ty
     for item in (found + ambiguous):
         text += _format_item_line(item)
 
-    for item in not_found:
-        name_input = item["query"]
+    if not_found:
+        missed = [item["query"] for item in not_found]
         prompt_id = data.get('prompt_message_id')
         username = message.from_user.username
 
-        request_id = await send_request_to_moderator(name_input, category, geo, prompt_id, username, message,requests_service, subscribers_service)
-        item_text = f"\n{name_input.title()} - Отправлен запрос модератору 🟡 Номер заявки: {request_id}"
-        text += item_text
+        request_ids = await send_batch_request_to_moderator(missed, category, geo, prompt_id, username, message,
+                                                            requests_service, subscribers_service)
+        for name_input, request_id in zip(missed, request_ids):
+            item_text = f"\n{name_input.title()} - Отправлен запрос модератору 🟡 Номер заявки: {request_id}"
+            text += item_text
 
     kb = get_new_search_button()
     await message.answer(text=text, reply_markup=kb.as_markup())
@@ -343,10 +345,11 @@ async def available_celebs_handler(call: types.CallbackQuery, celebrity_service:
     geo = data.get('geo')
     category = data.get('cat')
 
-    celebs = await celebrity_service.get_celebrities(geo, category)
+    celebs, prev_key, next_key = await celebrity_service.get_celebrities_page(geo, category)
     if celebs:
-        text = f"<b>Доступные селебы на {geo.title()}/{category.title()}:</b>\n\n" + "\n".join(c.title() for c in celebs)
-        await call.message.answer(text, parse_mode="html")
+        text = build_celebs_page_text(geo, category, celebs)
+        kb = get_listing_page_keyboard(geo, category, prev_key, next_key)
+        await call.message.answer(text, parse_mode="html", reply_markup=kb.as_markup())
         await call.answer()
     else:
         await call.message.answer("Пока нет согласованных селеб по этому гео и категории. Вы можете отправить заявку модератору через команду /search")
@@ -359,6 +362,28 @@ async def available_celebs_handler(call: types.CallbackQuery, celebrity_service:
         pass
 
 
+async def celebs_page_handler(call: types.CallbackQuery, celebrity_service: CelebrityService):
+    _, geo, category, page_key = call.data.split(":", 3)
+    await call.answer()
+
+    # ключ — граница по имени, а не номер страницы: после пересборки списка страница не съезжает
+    celebs, prev_key, next_key = await celebrity_service.get_celebrities_page(
+        geo, category, page_key[1:], backward=page_key.startswith("<"))
+    if not celebs:
+        return await call.message.edit_text("Пока нет согласованных селеб по этому гео и категории.")
+
+    kb = get_listing_page_keyboard(geo, category, prev_key, next_key)
+    try:
+        await call.message.edit_text(build_celebs_page_text(geo, category, celebs), parse_mode="html",
+                                     reply_markup=kb.as_markup())
+    except TelegramBadRequest:
+        pass
+
+
+def build_celebs_page_text(geo: str, category: str, celebs: list[str]) -> str:
+    return f"<b>Доступные селебы на {geo.title()}/{category.title()}:</b>\n\n" + "\n".join(c.title() for c in celebs)
+
+
 async def back_handler(call: types.CallbackQuery, state: FSMContext):
     where = call.data.split(":", 1)[1]
     await call.answer()
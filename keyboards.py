@@ -58,3 +58,47 @@ def cancel_role_change_kb():
     kb = InlineKeyboardBuilder()
     kb.button(text="❌Отмена", callback_data="cancel_role_change")
     return kb
+
+
+CALLBACK_DATA_LIMIT = 64
+
+
+def listing_page_callback(geo: str, cat: str, direction: str, key: str) -> str:
+    # direction: ">" — страница с key, "<" — страница перед key
+    data = f"celebs_page:{geo}:{cat}:{direction}"
+    # ключ страницы — короткий префикс имени, но длинный общий префикс может не влезть в 64 байта;
+    # укороченный ключ сдвигает страницу на несколько имён, но не ломает листание
+    while key and len((data + key).encode()) > CALLBACK_DATA_LIMIT:
+        key = key[:-1]
+    return data + key
+
+
+def get_listing_page_keyboard(geo: str, cat: str, prev_key: str | None, next_key: str | None):
+    kb = InlineKeyboardBuilder()
+    if prev_key is not None:
+        kb.button(text="⬅️", callback_data=listing_page_callback(geo, cat, "<", prev_key))
+    if next_key is not None:
+        kb.button(text="➡️", callback_data=listing_page_callback(geo, cat, ">", next_key))
+    return kb
+
+
+def get_bulk_moderation_keyboard(requests: list, selected: set[int], page: int, pages: int):
+    kb = InlineKeyboardBuilder()
+    for request_id, name, *_ in requests:
+        mark = "☑️" if request_id in selected else "⬜"
+        kb.button(text=f"{mark} {request_id} {name.title()}", callback_data=f"bulk:toggle:{request_id}")
+
+    nav = 0
+    if page > 0:
+        kb.button(text="⬅️", callback_data=f"bulk:page:{page - 1}")
+        nav += 1
+    if page < pages - 1:
+        kb.button(text="➡️", callback_data=f"bulk:page:{page + 1}")
+        nav += 1
+
+    kb.button(text="Выбрать все / снять", callback_data="bulk:all")
+    kb.button(text="✅ Одобрить", callback_data="bulk:approve")
+    kb.button(text="⛔ Забанить", callback_data="bulk:ban")
+    kb.button(text="❌Отмена", callback_data="bulk:cancel")
+    kb.adjust(*([1] * len(requests)), *([nav] if nav else []), 1, 2, 1)
+    return kb
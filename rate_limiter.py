@@ -0,0 +1,238 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Coroutine, Iterable
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from cachetools import TTLCache
+
+from config import logger
+
+
+# лимиты Telegram Bot API: ~30 сообщений/с на бота, ~1/с в личный чат, ~20/мин в группу
+GLOBAL_RATE = 30
+PRIVATE_CHAT_RATE = 1
+GROUP_CHAT_RATE = 20 / 60
+# сколько сообщений подряд можно отправить в чат без ожидания
+PRIVATE_CHAT_BURST = 3
+GROUP_CHAT_BURST = 5
+# лимит на чат касается новых сообщений; правки и удаления ограничены только общим лимитом
+PER_CHAT_METHOD_PREFIXES = ("send", "copy", "forward")
+MAX_RETRIES = 3
+
+# классы приоритета исходящих запросов: меньше - важнее
+INTERACTIVE = 0  # ответы юзеру в текущем апдейте
+NOTIFY = 1       # рассылки модераторам
+BULK = 2         # массовые операции
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NOTIFY: "notify", BULK: "bulk"}
+
+_priority: contextvars.ContextVar[int] = contextvars.ContextVar("outbound_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int):
+    """
+    Outgoing requests made inside the block use the given priority class.
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class PriorityTokenBucket:
+    """
+    Token bucket (``rate`` tokens per second, up to ``capacity``) that hands
+    tokens to waiters by priority, then FIFO within one priority.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._pump: asyncio.Task | None = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, level: int = INTERACTIVE):
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (level, next(self._seq), future))
+        if self._pump is None or self._pump.done():
+            self._pump = asyncio.get_running_loop().create_task(self._run())
+        await future
+
+    async def _run(self):
+        while self._waiters:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                self.tokens -= 1
+                future.set_result(None)
+
+    def pause(self, seconds: float):
+        # после RetryAfter бакет пуст на указанное время
+        self.tokens = 1 - seconds * self.rate
+        self.updated = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+
+class PriorityMetrics:
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.waiting = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "retried": self.retried,
+            "waiting": self.waiting,
+            "avg_wait": round(self.wait_total / self.sent, 3) if self.sent else 0.0,
+            "max_wait": round(self.wait_max, 3),
+        }
+
+
+class TelegramRateLimiter:
+    """
+    Outbound scheduler for Bot API calls. Every request addressed to a chat
+    waits for a per-chat and a global token, granted by priority class
+    (interactive > notify > bulk), and is retried on RetryAfter. Installed as
+    a session middleware, so handlers keep calling the bot as usual and only
+    pick the priority of background work. Also owns background tasks.
+    """
+
+    def __init__(self, global_rate: float = GLOBAL_RATE, max_retries: int = MAX_RETRIES):
+        self.global_bucket = PriorityTokenBucket(global_rate, global_rate)
+        self.max_retries = max_retries
+        # бакет, не использовавшийся минуту, всё равно полон — его можно выкинуть
+        self._chats: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+        self._tasks: set[asyncio.Task] = set()
+        self._metrics = {level: PriorityMetrics() for level in PRIORITY_NAMES}
+
+    def _chat_bucket(self, chat_id: int | str) -> PriorityTokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = PriorityTokenBucket(PRIVATE_CHAT_RATE, PRIVATE_CHAT_BURST)
+            else:
+                bucket = PriorityTokenBucket(GROUP_CHAT_RATE, GROUP_CHAT_BURST)
+        # переустанавливаем, чтобы продлить TTL активного чата
+        self._chats[chat_id] = bucket
+        return bucket
+
+    async def call(self, chat_id: int | str, request: Callable[[], Awaitable], per_chat: bool = True):
+        """
+        Runs ``request()`` once the buckets allow it, retrying on RetryAfter.
+        With ``per_chat=False`` only the global bucket applies.
+        """
+        level = _priority.get()
+        metrics = self._metrics[level]
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            metrics.waiting += 1
+            try:
+                if per_chat:
+                    await self._chat_bucket(chat_id).acquire(level)
+                await self.global_bucket.acquire(level)
+            finally:
+                metrics.waiting -= 1
+            waited = time.monotonic() - started
+            try:
+                result = await request()
+            except TelegramRetryAfter as e:
+                if attempt == self.max_retries:
+                    metrics.failed += 1
+                    raise
+                metrics.retried += 1
+                logger.warning(f"Flood control for chat {chat_id}, retry in {e.retry_after}s")
+                if per_chat:
+                    self._chat_bucket(chat_id).pause(e.retry_after)
+                else:
+                    await asyncio.sleep(e.retry_after)
+                continue
+            except Exception:
+                metrics.failed += 1
+                raise
+            metrics.sent += 1
+            metrics.wait_total += waited
+            metrics.wait_max = max(metrics.wait_max, waited)
+            return result
+
+    async def fan_out(self, chat_ids: Iterable[int], request: Callable[[int], Awaitable]) -> dict:
+        """
+        Runs ``request(chat_id)`` for every chat concurrently.
+        Returns {chat_id: result or exception}.
+        """
+        chat_ids = list(chat_ids)
+        results = await asyncio.gather(*(request(chat_id) for chat_id in chat_ids), return_exceptions=True)
+        return dict(zip(chat_ids, results))
+
+    def spawn(self, coro: Coroutine, level: int = NOTIFY) -> asyncio.Task:
+        # чистый контекст: фоновая задача не должна делить соединение/транзакцию апдейта
+        context = contextvars.Context()
+        context.run(_priority.set, level)
+        task = asyncio.get_running_loop().create_task(coro, context=context)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background task failed", exc_info=task.exception())
+
+    def metrics(self) -> dict:
+        return {
+            "queued_global": len(self.global_bucket),
+            "background_tasks": len(self._tasks),
+            **{name: self._metrics[level].as_dict() for level, name in PRIORITY_NAMES.items()},
+        }
+
+    async def log_metrics(self, interval: float = 300):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f"Outbound Telegram queue: {self.metrics()}")
+
+
+class RateLimitMiddleware(BaseRequestMiddleware):
+    """
+    Session middleware routing every chat-addressed Bot API call through the limiter.
+    """
+
+    def __init__(self, limiter: TelegramRateLimiter):
+        self.limiter = limiter
+
+    async def __call__(self, make_request, bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            # getUpdates, answerCallbackQuery и т.п. не ограничиваем
+            return await make_request(bot, method)
+        per_chat = getattr(method, "__api_method__", "").startswith(PER_CHAT_METHOD_PREFIXES)
+        return await self.limiter.call(chat_id, lambda: make_request(bot, method), per_chat=per_chat)
+
+
+LIMITER = TelegramRateLimiter()
@@ -0,0 +1,148 @@
+"""
+Sheets sync throughput against the local API emulator (scripts/sheets_emulator.py):
+push_row, push_rows, delete_row_by_id and the full export at several sheet sizes.
+
+    python scripts/bench_sheets.py
+    python scripts/bench_sheets.py --sizes 1000 10000 --latency 0.05
+
+No spreadsheet or service account key is needed. The full export reads
+rows from memory instead of Postgres, so only the Sheets side is measured.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+from sheets_emulator import SheetsEmulator  # noqa: E402
+
+HEADER = ["id", "name", "category", "geo", "status", "reason"]
+CATEGORIES = ["суставы", "омоложение", "все", "зрение", "похудение"]
+GEOS = ["россия", "польша", "казахстан", "германия"]
+
+
+def sheet_row(record: dict) -> list[str]:
+    return [str(record["id"]), record["name"].title(), record["category"], record["geo"].title(),
+            record["status"], record["reason"] or ""]
+
+
+def make_record(rec_id: int) -> dict:
+    return {
+        "id": rec_id,
+        "name": f"celebrity {rec_id}",
+        "category": CATEGORIES[rec_id % len(CATEGORIES)],
+        "geo": GEOS[rec_id % len(GEOS)],
+        "status": "согласована" if rec_id % 3 else "нельзя использовать",
+        "reason": None if rec_id % 3 else "причина",
+    }
+
+
+class MemoryCelebrities:
+    """The part of CelebrityService the full export uses, backed by a list."""
+
+    def __init__(self, size: int):
+        self.records = [make_record(i) for i in range(1, size + 1)]
+
+    async def count_celebrities(self) -> int:
+        return len(self.records)
+
+    async def iter_chunks(self, chunk_size: int):
+        for i in range(0, len(self.records), chunk_size):
+            yield self.records[i:i + chunk_size]
+
+    async def sync_point(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    async def set_sync_watermark(self, name: str, synced_at: datetime):
+        pass
+
+    async def prune_deletions(self, before: datetime):
+        pass
+
+
+def measure(emulator: SheetsEmulator, fn, *args) -> tuple[float, int]:
+    """Seconds spent and API calls made by fn(*args)."""
+    before = sum(emulator.calls.values())
+    started = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - started, sum(emulator.calls.values()) - before
+
+
+def run_size(emulator: SheetsEmulator, size: int, ops: int, batch: int) -> list[tuple[str, int, float, int]]:
+    import sheets_client
+    import sheets_sync
+
+    emulator.spreadsheet.seed([HEADER] + [sheet_row(make_record(i)) for i in range(1, size + 1)])
+    sheets_client.invalidate_row_index()
+    results = []
+    rnd = random.Random(size)
+
+    # первый вызов грузит индекс id -> строка
+    elapsed, calls = measure(emulator, sheets_client.push_row, make_record(1))
+    results.append(("push_row (cold index)", 1, elapsed, calls))
+
+    def push_row_many():
+        for rec_id in rnd.sample(range(1, size + 1), ops):
+            sheets_client.push_row({**make_record(rec_id), "status": "нельзя использовать"})
+    elapsed, calls = measure(emulator, push_row_many)
+    results.append(("push_row", ops, elapsed, calls))
+
+    # пачка из обновлений существующих строк и новых записей
+    records = [make_record(rec_id) for rec_id in rnd.sample(range(1, size + 1), batch * 4 // 5)]
+    records += [make_record(rec_id) for rec_id in range(size + 1, size + 1 + batch - len(records))]
+    elapsed, calls = measure(emulator, sheets_client.push_rows, records)
+    results.append(("push_rows", len(records), elapsed, calls))
+
+    def delete_many():
+        for rec_id in rnd.sample(range(2, size + 1), ops):
+            sheets_client.delete_row_by_id(rec_id)
+    elapsed, calls = measure(emulator, delete_many)
+    results.append(("delete_row_by_id", ops, elapsed, calls))
+
+    source = MemoryCelebrities(size)
+    elapsed, calls = measure(emulator, asyncio.run, sheets_sync.export_celebrities_to_sheets(source))
+    results.append(("full export", size, elapsed, calls))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--ops", type=int, default=50, help="push_row / delete_row_by_id calls per size")
+    parser.add_argument("--batch", type=int, default=500, help="records in one push_rows call")
+    parser.add_argument("--latency", type=float, default=0.0, help="emulated API latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with 429/503")
+    parser.add_argument("--quota", type=int, default=None,
+                        help="requests per minute, enforced by the emulator and the client throttler")
+    args = parser.parse_args()
+
+    emulator = SheetsEmulator(latency=args.latency, error_rate=args.error_rate, quota=args.quota).start()
+    # sheets_client читает настройки при импорте
+    os.environ["SHEETS_API_URL"] = emulator.url
+    os.environ.setdefault("SPREADSHEET_ID", "bench")
+    os.environ.setdefault("ADMIN_ID", "0")
+    os.environ["SHEETS_REQUESTS_PER_MINUTE"] = str(args.quota or 10 ** 9)
+    os.environ["SHEETS_QUEUE_PATH"] = os.path.join(tempfile.mkdtemp(), "sheets_queue.sqlite3")
+
+    import logging
+    import config  # noqa: F401  настраивает логирование — после него приглушаем INFO
+    logging.getLogger().setLevel(logging.WARNING)
+
+    print(f"{'rows':>7}  {'operation':<22} {'n':>6} {'total, s':>9} {'per op, ms':>11} {'API calls':>10}")
+    for size in args.sizes:
+        for name, n, elapsed, calls in run_size(emulator, size, args.ops, args.batch):
+            print(f"{size:>7}  {name:<22} {n:>6} {elapsed:>9.3f} {elapsed / n * 1000:>11.2f} {calls:>10}")
+    print(f"Emulator calls: {dict(Counter(emulator.calls))}")
+    emulator.stop()
+
+
+if __name__ == "__main__":
+    main()
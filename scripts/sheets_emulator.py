@@ -0,0 +1,358 @@
+"""
+Local stand-in for the subset of the Google Sheets v4 API used by
+sheets_client / sheets_sync: spreadsheets.get, values.get/update/append/clear
+and batchUpdate with updateCells/appendCells/deleteDimension.
+
+    python scripts/sheets_emulator.py --port 8765 --latency 0.05 --quota 60
+    SHEETS_API_URL=http://127.0.0.1:8765/ SPREADSHEET_ID=test python bot.py
+
+Latency, random errors and a per-minute quota can be injected to see how
+the client behaves under Google's limits. Data lives in memory only.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, unquote
+
+DEFAULT_SHEET = "celebrities"
+DEFAULT_ROW_COUNT = 1000
+COLUMN_COUNT = 26
+
+_A1 = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def _column(letters: str) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - ord("A") + 1
+    return index - 1
+
+
+def _letters(column: int) -> str:
+    letters = ""
+    column += 1
+    while column:
+        column, rest = divmod(column - 1, 26)
+        letters = chr(ord("A") + rest) + letters
+    return letters
+
+
+def parse_range(a1: str) -> tuple[str, int | None, int | None, int | None, int | None]:
+    """
+    "celebrities!A2:F10" -> (sheet, row1, col1, row2, col2), 0-based, inclusive.
+    Omitted bounds are None ("A:F", "A2:A", "A1").
+    """
+    sheet, _, cells = a1.rpartition("!")
+    sheet = sheet.strip("'") or DEFAULT_SHEET
+    start, _, end = cells.partition(":")
+    bounds = []
+    for part in (start, end):
+        match = _A1.match(part.upper())
+        if match is None:
+            raise ValueError(f"Bad range: {a1}")
+        letters, digits = match.groups()
+        bounds.append((int(digits) - 1 if digits else None, _column(letters) if letters else None))
+    (r1, c1), (r2, c2) = bounds
+    return sheet, r1, c1, r2, c2
+
+
+class ApiError(Exception):
+    def __init__(self, code: int, status: str, message: str):
+        self.code = code
+        self.status = status
+        self.message = message
+
+
+class Spreadsheet:
+    """In-memory sheets: title -> grid of string cells."""
+
+    def __init__(self, title: str = DEFAULT_SHEET, row_count: int = DEFAULT_ROW_COUNT):
+        self.lock = threading.Lock()
+        self.sheets: dict[str, dict] = {}
+        self.add_sheet(title, row_count)
+
+    def add_sheet(self, title: str, row_count: int = DEFAULT_ROW_COUNT):
+        self.sheets[title] = {"sheetId": len(self.sheets), "rows": [], "row_count": row_count}
+
+    def _sheet(self, title: str) -> dict:
+        if title not in self.sheets:
+            raise ApiError(400, "INVALID_ARGUMENT", f"Unable to parse range: {title}")
+        return self.sheets[title]
+
+    def _by_id(self, sheet_id: int) -> dict:
+        for sheet in self.sheets.values():
+            if sheet["sheetId"] == sheet_id:
+                return sheet
+        raise ApiError(400, "INVALID_ARGUMENT", f"No grid with id: {sheet_id}")
+
+    @staticmethod
+    def _last_data_row(sheet: dict, c1: int = 0, c2: int = COLUMN_COUNT - 1) -> int:
+        rows = sheet["rows"]
+        for i in range(len(rows) - 1, -1, -1):
+            if any(rows[i][c1:c2 + 1]):
+                return i
+        return -1
+
+    @staticmethod
+    def _write(sheet: dict, row: int, col: int, values: list[list]):
+        rows = sheet["rows"]
+        for offset, row_values in enumerate(values):
+            i = row + offset
+            while len(rows) <= i:
+                rows.append([])
+            cells = rows[i]
+            end = col + len(row_values)
+            if len(cells) < end:
+                cells.extend([""] * (end - len(cells)))
+            cells[col:end] = ["" if v is None else str(v) for v in row_values]
+        sheet["row_count"] = max(sheet["row_count"], len(rows))
+
+    def seed(self, values: list[list], title: str = DEFAULT_SHEET):
+        with self.lock:
+            sheet = self._sheet(title)
+            sheet["rows"] = []
+            self._write(sheet, 0, 0, values)
+
+    def get(self) -> dict:
+        return {"sheets": [{
+            "properties": {
+                "sheetId": sheet["sheetId"],
+                "title": title,
+                "gridProperties": {"rowCount": sheet["row_count"], "columnCount": COLUMN_COUNT},
+            }
+        } for title, sheet in self.sheets.items()]}
+
+    def values_get(self, a1: str) -> dict:
+        title, r1, c1, r2, c2 = parse_range(a1)
+        sheet = self._sheet(title)
+        r1, c1 = r1 or 0, c1 or 0
+        r2 = sheet["row_count"] - 1 if r2 is None else r2
+        c2 = COLUMN_COUNT - 1 if c2 is None else c2
+        values = []
+        for cells in sheet["rows"][r1:r2 + 1]:
+            cells = cells[c1:c2 + 1]
+            while cells and not cells[-1]:
+                cells = cells[:-1]
+            values.append(cells)
+        # как и Google, хвостовые пустые строки не отдаём
+        while values and not values[-1]:
+            values.pop()
+        resp = {"range": a1, "majorDimension": "ROWS"}
+        if values:
+            resp["values"] = values
+        return resp
+
+    def values_update(self, a1: str, body: dict) -> dict:
+        title, r1, c1, _, _ = parse_range(a1)
+        sheet = self._sheet(title)
+        values = body.get("values", [])
+        self._write(sheet, r1 or 0, c1 or 0, values)
+        return {"updatedRange": a1, "updatedRows": len(values)}
+
+    def values_append(self, a1: str, body: dict) -> dict:
+        title, _, c1, _, c2 = parse_range(a1)
+        sheet = self._sheet(title)
+        c1 = c1 or 0
+        c2 = COLUMN_COUNT - 1 if c2 is None else c2
+        values = body.get("values", [])
+        row = self._last_data_row(sheet, c1, c2) + 1
+        self._write(sheet, row, c1, values)
+        width = max((len(v) for v in values), default=1)
+        updated = f"{title}!{_letters(c1)}{row + 1}:{_letters(c1 + width - 1)}{row + len(values)}"
+        return {"updates": {"updatedRange": updated, "updatedRows": len(values)}}
+
+    def values_clear(self, a1: str) -> dict:
+        title, r1, c1, r2, c2 = parse_range(a1)
+        sheet = self._sheet(title)
+        r1, c1 = r1 or 0, c1 or 0
+        c2 = COLUMN_COUNT - 1 if c2 is None else c2
+        for cells in sheet["rows"][r1:None if r2 is None else r2 + 1]:
+            for i in range(c1, min(c2 + 1, len(cells))):
+                cells[i] = ""
+        return {"clearedRange": a1}
+
+    @staticmethod
+    def _cell_values(rows: list[dict]) -> list[list]:
+        result = []
+        for row in rows:
+            values = []
+            for cell in row.get("values", []):
+                entered = cell.get("userEnteredValue", {})
+                values.append(next(iter(entered.values()), ""))
+            result.append(values)
+        return result
+
+    def batch_update(self, body: dict) -> dict:
+        replies = []
+        for i, request in enumerate(body.get("requests", [])):
+            try:
+                self._apply_request(request)
+            except ApiError as e:
+                # как в Sheets: ошибка указывает на запрос пачки
+                raise ApiError(e.code, e.status, f"Invalid requests[{i}].{next(iter(request), '')}: {e.message}")
+            replies.append({})
+        return {"replies": replies}
+
+    def _apply_request(self, request: dict):
+        if "updateCells" in request:
+            req = request["updateCells"]
+            grid = req["range"]
+            sheet = self._by_id(grid.get("sheetId", 0))
+            self._write(sheet, grid.get("startRowIndex", 0), grid.get("startColumnIndex", 0),
+                        self._cell_values(req.get("rows", [])))
+        elif "appendCells" in request:
+            req = request["appendCells"]
+            sheet = self._by_id(req.get("sheetId", 0))
+            self._write(sheet, self._last_data_row(sheet) + 1, 0, self._cell_values(req.get("rows", [])))
+        elif "deleteDimension" in request:
+            grid = request["deleteDimension"]["range"]
+            if grid.get("dimension") != "ROWS":
+                raise ApiError(400, "INVALID_ARGUMENT", "Only ROWS deletion is emulated")
+            sheet = self._by_id(grid.get("sheetId", 0))
+            start, end = grid["startIndex"], grid["endIndex"]
+            del sheet["rows"][start:end]
+            sheet["row_count"] = max(1, sheet["row_count"] - (end - start))
+        else:
+            raise ApiError(400, "INVALID_ARGUMENT", f"Request not emulated: {list(request)}")
+
+
+
+class SheetsEmulator:
+    """
+    HTTP server over a Spreadsheet. ``latency`` seconds are added to every
+    call, ``error_rate`` of calls fail with a random 429/503 and more than
+    ``quota`` calls in the last 60 seconds fail with 429.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0,
+                 error_rate: float = 0.0, quota: int | None = None, spreadsheet: Spreadsheet = None):
+        self.spreadsheet = spreadsheet or Spreadsheet()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.quota = quota
+        self.calls: Counter = Counter()
+        self._window: deque = deque()
+        self._window_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self) -> "SheetsEmulator":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _check_faults(self):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.quota is not None:
+            now = time.monotonic()
+            with self._window_lock:
+                while self._window and now - self._window[0] > 60:
+                    self._window.popleft()
+                if len(self._window) >= self.quota:
+                    raise ApiError(429, "RESOURCE_EXHAUSTED", "Quota exceeded for quota metric 'Write requests'")
+                self._window.append(now)
+        if self.error_rate and random.random() < self.error_rate:
+            code = random.choice((429, 503))
+            raise ApiError(code, "RESOURCE_EXHAUSTED" if code == 429 else "UNAVAILABLE", "Injected error")
+
+    def dispatch(self, method: str, path: str, body: dict) -> tuple[str, dict]:
+        """
+        Routes a request; returns (operation name, response body).
+        """
+        parts = path.strip("/").split("/")
+        if parts[:2] != ["v4", "spreadsheets"] or len(parts) < 3:
+            raise ApiError(404, "NOT_FOUND", f"Unknown path: {path}")
+        sheets = self.spreadsheet
+        target, _, action = parts[2].partition(":")
+        if len(parts) == 3:
+            if method == "GET" and not action:
+                return "get", sheets.get()
+            if method == "POST" and action == "batchUpdate":
+                return "batchUpdate", sheets.batch_update(body)
+        elif parts[3] == "values" and len(parts) == 5:
+            a1, action = parts[4], ""
+            if a1.rsplit(":", 1)[-1] in ("append", "clear"):
+                a1, action = a1.rsplit(":", 1)
+            a1 = unquote(a1)
+            if method == "GET" and not action:
+                return "values.get", sheets.values_get(a1)
+            if method == "PUT" and not action:
+                return "values.update", sheets.values_update(a1, body)
+            if method == "POST" and action == "append":
+                return "values.append", sheets.values_append(a1, body)
+            if method == "POST" and action == "clear":
+                return "values.clear", sheets.values_clear(a1)
+        raise ApiError(404, "NOT_FOUND", f"Not emulated: {method} {path}")
+
+    def _handler(self):
+        emulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _serve(self, method: str):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else {}
+                    emulator._check_faults()
+                    with emulator.spreadsheet.lock:
+                        op, resp = emulator.dispatch(method, urlsplit(self.path).path, body)
+                    emulator.calls[op] += 1
+                    code = 200
+                except ApiError as e:
+                    emulator.calls[f"error.{e.code}"] += 1
+                    code, resp = e.code, {"error": {"code": e.code, "message": e.message, "status": e.status}}
+                except (ValueError, KeyError) as e:
+                    code, resp = 400, {"error": {"code": 400, "message": str(e), "status": "INVALID_ARGUMENT"}}
+                data = json.dumps(resp).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json; charset=UTF-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_PUT(self):
+                self._serve("PUT")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls failing with 429/503")
+    parser.add_argument("--quota", type=int, default=None, help="calls per minute before 429")
+    args = parser.parse_args()
+
+    emulator = SheetsEmulator(args.host, args.port, args.latency, args.error_rate, args.quota)
+    print(f"Sheets API emulator on {emulator.url}")
+    try:
+        emulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -1,27 +1,202 @@
+import heapq
 import os
+import random
+import threading
+import time
+
+from google.auth.credentials import AnonymousCredentials
+from google.auth.exceptions import TransportError
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from httplib2 import HttpLib2Error
 from config import logger
 
 
 SPREADSHEET_ID = os.environ["SPREADSHEET_ID"]
 SHEET_NAME     = os.getenv("SHEET_NAME", "celebrities")
-SA_KEY_PATH    = os.environ["GOOGLE_SA_KEY_PATH"]
+# адрес совместимого с Sheets v4 сервера (локальный эмулятор scripts/sheets_emulator.py)
+SHEETS_API_URL = os.getenv("SHEETS_API_URL")
+SA_KEY_PATH    = os.environ["GOOGLE_SA_KEY_PATH"] if not SHEETS_API_URL else os.getenv("GOOGLE_SA_KEY_PATH")
+SHEETS_INDEX_TTL = int(os.getenv("SHEETS_INDEX_TTL", 600))
+# квота Sheets API считается в запросах в минуту на пользователя (сервисный аккаунт)
+SHEETS_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_REQUESTS_PER_MINUTE", 60))
+MAX_RETRIES = 5
+BACKOFF_BASE = 1
+MAX_BACKOFF = 64
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# сеть: сокеты, httplib2 (в т.ч. ServerNotFoundError при сбое DNS), запрос токена
+NETWORK_ERRORS = (OSError, HttpLib2Error, TransportError)
 
 # Авторизация и клиент API
-_creds  = service_account.Credentials.from_service_account_file(
-    SA_KEY_PATH,
-    scopes=["https://www.googleapis.com/auth/spreadsheets"]
-)
-_service = build("sheets", "v4", credentials=_creds)
+if SHEETS_API_URL:
+    # эмулятор не проверяет авторизацию
+    _service = build("sheets", "v4", credentials=AnonymousCredentials(),
+                     client_options={"api_endpoint": SHEETS_API_URL})
+else:
+    _creds  = service_account.Credentials.from_service_account_file(
+        SA_KEY_PATH,
+        scopes=["https://www.googleapis.com/auth/spreadsheets"]
+    )
+    _service = build("sheets", "v4", credentials=_creds)
 _sheets  = _service.spreadsheets()
 
+
+class SheetsQuota:
+    """
+    Requests-per-minute budget shared by all threads of the process: a token
+    bucket refilled at per_minute / 60 tokens a second, up to per_minute.
+    """
+
+    def __init__(self, per_minute: int = SHEETS_REQUESTS_PER_MINUTE):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self.tokens
+
+    def wait_time(self) -> float:
+        """Секунд до следующего свободного запроса."""
+        with self._lock:
+            self._refill()
+            return max(0.0, (1 - self.tokens) / self.rate)
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def exhaust(self):
+        # после 429 считаем, что минутная квота выбрана
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+class CallStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.time_total = 0.0
+        self.time_max = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "avg_time": round(self.time_total / self.calls, 3) if self.calls else 0.0,
+            "max_time": round(self.time_max, 3),
+        }
+
+
+QUOTA = SheetsQuota()
+_stats: dict[str, CallStats] = {}
+_stats_lock = threading.Lock()
+
+
+def _record(op: str, elapsed: float | None = None, error: bool = False, retry: bool = False):
+    with _stats_lock:
+        stats = _stats.setdefault(op, CallStats())
+        stats.calls += 1
+        stats.errors += error
+        stats.retries += retry
+        if elapsed is not None:
+            stats.time_total += elapsed
+            stats.time_max = max(stats.time_max, elapsed)
+
+
+def metrics() -> dict:
+    """Счётчики вызовов Sheets API по типу операции и остаток квоты."""
+    with _stats_lock:
+        result = {op: stats.as_dict() for op, stats in _stats.items()}
+    result["quota_available"] = round(QUOTA.available(), 1)
+    return result
+
+
+class RejectedRecord(ValueError):
+    """Запись, которую нельзя превратить в строку таблицы."""
+
+
+def is_rejected(e: Exception) -> bool:
+    """
+    Ошибка из-за самих записей пачки: Sheets отклонил один из запросов
+    batchUpdate (400 "Invalid requests[i]...") или запись не собирается в строку.
+    Сеть, квота, авторизация и пропавший лист/диапазон сюда не относятся.
+    """
+    if isinstance(e, RejectedRecord):
+        return True
+    if isinstance(e, HttpError) and e.resp.status == 400:
+        reason = str(e.reason or "")
+        # лист удалён — ошибка на весь батч, а не на запрос
+        return "requests[" in reason and "No grid with id" not in reason
+    return False
+
+
+def _uncertain(e: Exception) -> bool:
+    """5xx или обрыв соединения: запрос мог и примениться."""
+    if isinstance(e, HttpError):
+        return e.resp.status in RETRY_STATUSES and e.resp.status != 429
+    return isinstance(e, NETWORK_ERRORS)
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, min(MAX_BACKOFF, BACKOFF_BASE * 2 ** attempt))
+
+
+def _execute(request, op: str, idempotent: bool = True):
+    """
+    Runs a Sheets API request within the per-minute budget, retrying 429
+    and 5xx (and connection errors) with jittered exponential backoff.
+    Non-idempotent requests (appends, row deletes) are retried on 429 only:
+    after a 5xx or a dropped connection the write may already be applied,
+    so the caller has to check the sheet and rebuild the request.
+    Every attempt is counted under ``op``.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        QUOTA.acquire()
+        started = time.monotonic()
+        try:
+            result = request.execute()
+        except (HttpError, *NETWORK_ERRORS) as e:
+            elapsed = time.monotonic() - started
+            status = e.resp.status if isinstance(e, HttpError) else None
+            retryable = status == 429 or (idempotent and (status is None or status in RETRY_STATUSES))
+            if not retryable or attempt == MAX_RETRIES:
+                _record(op, elapsed, error=True)
+                raise
+            _record(op, elapsed, retry=True)
+            if status == 429:
+                QUOTA.exhaust()
+            delay = _backoff(attempt)
+            logger.warning(f"Sheets {op} failed ({status or type(e).__name__}), retry in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        _record(op, time.monotonic() - started)
+        return result
+
 def _get_sheet_id():
     """Numeric sheetId required for structural changes via batchUpdate."""
-    resp = _sheets.get(
+    resp = _execute(_sheets.get(
         spreadsheetId=SPREADSHEET_ID,
         fields="sheets(properties(sheetId,title))"
-    ).execute()
+    ), "get")
     for s in resp["sheets"]:
         props = s["properties"]
         if props["title"] == SHEET_NAME:
@@ -41,106 +216,188 @@ def _ensure_sheet_id() -> int:
 _SHEET_ID = None
 
 
+class SheetRowIndex:
+    """
+    In-process id -> sheet row index for column A. Loaded on first use,
+    updated after every write/delete and reloaded every ``ttl`` seconds to
+    pick up manual edits in the sheet. Writes check the rows they target
+    against the sheet first (_verify_index), since other processes and
+    staff change the sheet too.
+    """
+
+    def __init__(self, ttl: float = SHEETS_INDEX_TTL):
+        self.ttl = ttl
+        self.loaded_at: float | None = None
+        self._rows: dict[str, int] = {}
+        self._ids: dict[int, str] = {}
+        self._empty: list[int] = []
+        self.last_row = 1  # строка 1 — заголовок
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def ensure(self):
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl:
+            self.load()
+
+    def load(self):
+        resp = _execute(_sheets.values().get(
+            spreadsheetId=SPREADSHEET_ID,
+            range=f"{SHEET_NAME}!A2:A"
+        ), "values.get")
+        self._rows.clear()
+        self._ids.clear()
+        self._empty.clear()
+        self.last_row = 1
+        for i, row in enumerate(resp.get("values", []), start=2):
+            if row and row[0]:
+                self._rows[row[0]] = i
+                self._ids[i] = row[0]
+                self.last_row = i
+            else:
+                self._empty.append(i)
+        self._empty = [i for i in self._empty if i < self.last_row]
+        heapq.heapify(self._empty)
+        self.loaded_at = time.monotonic()
+        logger.info(f"Sheet row index loaded: {len(self._rows)} ids")
+
+    def get(self, str_id: str) -> int | None:
+        return self._rows.get(str_id)
+
+    def target_for(self, str_id: str) -> int | None:
+        """
+        Row for the id: its own row, else the first empty one (claimed).
+        None means the record has to be appended.
+        """
+        row = self._rows.get(str_id)
+        if row is not None:
+            return row
+        while self._empty:
+            row = heapq.heappop(self._empty)
+            if row not in self._ids:
+                self.set(str_id, row)
+                return row
+        return None
+
+    def expected(self, str_ids: list[str]) -> dict[int, str]:
+        """
+        Row -> what column A must hold there for writes of these ids to land
+        where the index says: each id's own row, the empty rows target_for
+        would claim ("") and, if some go past them, the row after the last one.
+        """
+        rows = {}
+        missing = 0
+        for str_id in str_ids:
+            row = self._rows.get(str_id)
+            if row is None:
+                missing += 1
+            else:
+                rows[row] = str_id
+        if missing:
+            empty = sorted(row for row in self._empty if row not in self._ids)[:missing]
+            rows.update((row, "") for row in empty)
+            if missing > len(empty):
+                rows[self.last_row + 1] = ""
+        return rows
+
+    def set(self, str_id: str, row: int):
+        old = self._rows.get(str_id)
+        if old is not None and old != row:
+            del self._ids[old]
+            heapq.heappush(self._empty, old)
+        previous_id = self._ids.get(row)
+        if previous_id is not None and previous_id != str_id:
+            del self._rows[previous_id]
+        self._rows[str_id] = row
+        self._ids[row] = str_id
+        self.last_row = max(self.last_row, row)
+
+    def appended(self, str_id: str, row: int | None = None):
+        self.set(str_id, row or self.last_row + 1)
+
+    def remove_row(self, row: int):
+        """
+        Mirrors deleteDimension: the row disappears and everything below moves up.
+        """
+        self._rows = {
+            str_id: (r - 1 if r > row else r)
+            for str_id, r in self._rows.items() if r != row
+        }
+        self._ids = {r: str_id for str_id, r in self._rows.items()}
+        self._empty = [r - 1 if r > row else r for r in self._empty if r != row]
+        heapq.heapify(self._empty)
+        self.last_row = max(self._rows.values(), default=1)
+
+
+_index = SheetRowIndex()
+_lock = threading.RLock()
+
+
+def invalidate_row_index():
+    """Call after the sheet was rewritten outside this module (full export)."""
+    with _lock:
+        _index.invalidate()
+
+
+def _row_values(record: dict) -> list:
+    return [
+        str(record.get("id") or ""),
+        record.get("name", "").title(),
+        record.get("category", ""),
+        record.get("geo", "").title(),
+        record.get("status", ""),
+        record.get("reason", "") or ""
+    ]
+
+
 def push_row(record: dict, sheet_row: int | None = None):
     """
     1. Если sheet_row передан — обновляем именно ту строку.
-    2. Иначе ищем record['id'] в столбце A и обновляем строку.
-    3. Если не найдена — ищем первую пустую строку и затираем её.
+    2. Иначе ищем record['id'] в индексе и обновляем строку.
+    3. Если не найдена — берём первую пустую строку и затираем её.
     4. Если и пустых нет — append в конец.
     """
-    str_id = str(record["id"])
-    # читаем IDs со 2-й по 1000-ю строку
-    resp     = _sheets.values().get(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_NAME}!A2:A5000"
-    ).execute()
-    id_cells = resp.get("values", [])
-
-    target = sheet_row
-    if target is None:
-        # ищем строку с этим id
-        for i, row in enumerate(id_cells, start=2):
-            if row and row[0] == str_id:
-                target = i
-                break
-    if target is None:
-        # ищем первую пустую
-        for i, row in enumerate(id_cells, start=2):
-            if not row or not row[0]:
-                target = i
-                break
-
-    values = [[
-        str_id,
-        record["name"].title(),
-        record["category"],
-        record["geo"].title(),
-        record["status"],
-        record.get("reason", "")
-    ]]
-
-    if target is None:
-        # append в конец
-        _sheets.values().append(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{SHEET_NAME}!A:F",
-            valueInputOption="RAW",
-            insertDataOption="INSERT_ROWS",
-            body={"values": values}
-        ).execute()
-    else:
-        # update по точному диапазону A{target}:E{target}
-        _sheets.values().update(
-            spreadsheetId=SPREADSHEET_ID,
-            range=f"{SHEET_NAME}!A{target}:F{target}",
-            valueInputOption="RAW",
-            body={"values": values}
-        ).execute()
+    write_batch([], [record], {record["id"]: sheet_row} if sheet_row else None)
 
 
-def push_rows(records: list[dict]):
-    sheet_id = _ensure_sheet_id()
-
-    # читаем все ID из таблицы
-    resp = _sheets.values().get(
+def _verify_index(str_ids: list[str]):
+    """
+    Reads back column A over the rows the index would write these ids to
+    and reloads the index if any of them holds something else.
+    """
+    expected = _index.expected(str_ids)
+    if not expected:
+        return
+    first, last = min(expected), max(expected)
+    resp = _execute(_sheets.values().get(
         spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_NAME}!A2:A5000"
-    ).execute()
-    id_cells = resp.get("values", [])
+        range=f"{SHEET_NAME}!A{first}:A{last}"
+    ), "values.get")
+    cells = resp.get("values", [])
+    for row, str_id in expected.items():
+        cell = cells[row - first] if row - first < len(cells) else []
+        if (cell[0] if cell else "") != str_id:
+            logger.info(f"Sheet row index is stale (row {row}), reloading")
+            _index.load()
+            return
+
 
+def _upsert_requests(sheet_id: int, records: list[dict]) -> tuple[list[dict], list[str]]:
+    """
+    Requests writing records to their rows (claiming rows in the index)
+    and the ids that go to appendCells, in order.
+    """
     requests = []
+    appended = []
 
     for record in records:
-        str_id = str(record.get("id") or "")
-        sheet_row = record.get("_row")
-        target = None
-
-        if sheet_row:
-            target = int(sheet_row)
-        elif str_id:
-            # ищем строку с этим id
-            for i, row in enumerate(id_cells, start=2):
-                if row and row[0] == str_id:
-                    target = i
-                    break
-        if target is None:
-            # ищем первую пустую
-            for i, row in enumerate(id_cells, start=2):
-                if not row or not row[0]:
-                    target = i
-                    break
-
-        values = [
-            str_id,
-            record.get("name", "").title(),
-            record.get("category", ""),
-            record.get("geo", "").title(),
-            record.get("status", ""),
-            record.get("reason", "") or ""
-        ]
+        values = _row_values(record)
+        str_id = values[0]
+        target = _index.target_for(str_id) if str_id else None
 
         if target is None:
             # append в конец
+            appended.append(str_id)
             requests.append({
                 "appendCells": {
                     "sheetId": sheet_id,
@@ -159,7 +416,7 @@ def push_rows(records: list[dict]):
                     }],
                     "fields": "userEnteredValue",
                     "range": {
-                        "sheetId": _SHEET_ID,
+                        "sheetId": sheet_id,
                         "startRowIndex": target - 1,
                         "endRowIndex": target,
                         "startColumnIndex": 0,
@@ -167,50 +424,240 @@ def push_rows(records: list[dict]):
                     }
                 }
             })
+    return requests, appended
 
-    if requests:
-        _sheets.batchUpdate(
-            spreadsheetId=SPREADSHEET_ID,
-            body={"requests": requests}
-        ).execute()
+
+def _batch_requests(sheet_id: int, delete_ids: list[int], records: list[dict],
+                    sheet_rows: dict[int, int]) -> tuple[list[dict], list[str], list[int]]:
+    """
+    Requests for write_batch built on the current index, which is shifted
+    as if they were applied. Also returns the appended ids and the ids to
+    delete that are not in the sheet.
+    """
+    loaded_at = _index.loaded_at
+    _index.ensure()
+    str_ids = [str(record_id) for record_id in delete_ids]
+    if any(_index.get(str_id) is None for str_id in str_ids):
+        # индекс мог устареть из-за ручных правок
+        _index.load()
+    elif _index.loaded_at == loaded_at:
+        # индекс не свежий: строки могли сдвинуть руками или другой процесс (вебхук)
+        _verify_index(str_ids + [
+            str(record["id"]) for record in records
+            if record.get("id") and record["id"] not in sheet_rows
+        ])
+    # строки известны по состоянию до удалений — ставим их в индекс до сдвига
+    for record_id, row in sheet_rows.items():
+        _index.set(str(record_id), row)
+    rows = {str_id: _index.get(str_id) for str_id in str_ids}
+    missing = [int(str_id) for str_id, row in rows.items() if row is None]
+
+    targets = sorted({row for row in rows.values() if row is not None}, reverse=True)
+    requests = [{
+        "deleteDimension": {
+            "range": {
+                "sheetId": sheet_id,
+                "dimension": "ROWS",
+                "startIndex": row - 1,
+                "endIndex": row
+            }
+        }
+    } for row in targets]
+    for row in targets:
+        _index.remove_row(row)
+
+    upserts, appended = _upsert_requests(sheet_id, records)
+    return requests + upserts, appended, missing
+
+
+def write_batch(delete_ids: list[int], records: list[dict], sheet_rows: dict[int, int] | None = None) -> list[int]:
+    """
+    Удаления и upsert-ы одним batchUpdate: сначала удаляем строки (снизу вверх,
+    чтобы не сдвигать ещё не удалённые), потом пишем записи по уже сдвинутому индексу.
+    sheet_rows — id -> строка таблицы для записей, чья строка уже известна
+    (новая строка, в которую id ещё не вписан).
+    Возвращает id на удаление, которых в таблице не оказалось.
+    """
+    for record in records:
+        try:
+            _row_values(record)
+        except (AttributeError, TypeError) as e:
+            raise RejectedRecord(f"Bad record {record.get('id')}: {e}") from e
+
+    with _lock:
+        sheet_id = _ensure_sheet_id()
+        missing = None
+
+        for attempt in range(MAX_RETRIES + 1):
+            requests, appended, not_found = _batch_requests(sheet_id, delete_ids, records, sheet_rows or {})
+            if missing is None:
+                missing = not_found
+            if not requests:
+                return missing
+
+            try:
+                _execute(_sheets.batchUpdate(
+                    spreadsheetId=SPREADSHEET_ID,
+                    body={"requests": requests}
+                ), "batchUpdate", idempotent=False)
+            except Exception as e:
+                # индекс уже сдвинут под запрос, который мог и не выполниться
+                _index.invalidate()
+                if not _uncertain(e) or attempt == MAX_RETRIES:
+                    raise
+                # batchUpdate атомарен: по перечитанному индексу запросы собираются заново,
+                # уже удалённые строки не удаляются второй раз, добавленные не дублируются
+                delay = _backoff(attempt)
+                logger.warning(f"Sheets batchUpdate may have failed, rebuilding in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            # appendCells пишет после последней заполненной строки, по порядку
+            for str_id in appended:
+                if str_id:
+                    _index.appended(str_id)
+                else:
+                    _index.last_row += 1
+            return missing
+
+
+def push_rows(records: list[dict], sheet_rows: dict[int, int] | None = None):
+    write_batch([], records, sheet_rows)
 
 
 def delete_row_by_id(record_id: int):
     """
     Удаляет строку, где в столбце A лежит record_id, смещая все ниже вверх.
     """
-    sheet_id = _ensure_sheet_id()
-    str_id = str(record_id)
-    # читаем IDs со 2-й по 1000-ю строку
-    resp     = _sheets.values().get(
+    if write_batch([record_id], []):
+        raise ValueError(f"ID {record_id} not found in column A")
+
+
+def delete_rows_by_ids(record_ids: list[int]) -> list[int]:
+    """
+    Удаляет строки нескольких id одним batchUpdate.
+    Возвращает id, которых в таблице не оказалось.
+    """
+    return write_batch(record_ids, [])
+
+
+HEADER = ["id", "name", "category", "geo", "status", "reason"]
+
+
+def write_rows(start_row: int, records: list[dict]):
+    """
+    Перезаписывает строки начиная с start_row подряд, без поиска по индексу (для полной выгрузки).
+    """
+    end_row = start_row + len(records) - 1
+    _execute(_sheets.values().update(
         spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_NAME}!A2:A5000"
-    ).execute()
-    id_cells = resp.get("values", [])
+        range=f"{SHEET_NAME}!A{start_row}:F{end_row}",
+        valueInputOption="RAW",
+        body={"values": [_row_values(record) for record in records]}
+    ), "values.update")
 
-    sheet_row = None
-    for i, row in enumerate(id_cells, start=2):
-        if row and row[0] == str_id:
-            sheet_row = i
-            break
 
-    if sheet_row is None:
-        raise ValueError(f"ID {record_id} not found in column A")
+def write_header():
+    _execute(_sheets.values().update(
+        spreadsheetId=SPREADSHEET_ID,
+        range=f"{SHEET_NAME}!A1:F1",
+        valueInputOption="RAW",
+        body={"values": [HEADER]}
+    ), "values.update")
+
+
+def clear_from(row: int):
+    """Очищает все строки начиная с row."""
+    _execute(_sheets.values().clear(
+        spreadsheetId=SPREADSHEET_ID,
+        range=f"{SHEET_NAME}!A{row}:F"
+    ), "values.clear")
+
+
+READ_PAGE_SIZE = 5000
+APPLY_CHUNK_SIZE = 500
+
 
-    # batchUpdate для удаления строки
-    body = {
-        "requests": [{
+def _row_count() -> int:
+    resp = _execute(_sheets.get(
+        spreadsheetId=SPREADSHEET_ID,
+        fields="sheets(properties(title,gridProperties(rowCount)))"
+    ), "get")
+    for s in resp["sheets"]:
+        props = s["properties"]
+        if props["title"] == SHEET_NAME:
+            return props["gridProperties"]["rowCount"]
+    raise ValueError(f"Sheet '{SHEET_NAME}' not found")
+
+
+def read_rows(page_size: int = READ_PAGE_SIZE) -> list[tuple[int, list[str]]]:
+    """
+    Все непустые строки данных (номер строки, значения A..F), постранично по page_size строк.
+    """
+    total = _row_count()
+    result = []
+    for start in range(2, total + 1, page_size):
+        end = min(start + page_size - 1, total)
+        resp = _execute(_sheets.values().get(
+            spreadsheetId=SPREADSHEET_ID,
+            range=f"{SHEET_NAME}!A{start}:F{end}"
+        ), "values.get")
+        for i, row in enumerate(resp.get("values", []), start=start):
+            if any(row):
+                result.append((i, (row + [""] * len(HEADER))[:len(HEADER)]))
+    return result
+
+
+def _cells(record: dict) -> list[dict]:
+    return [{"values": [{"userEnteredValue": {"stringValue": str(v)}} for v in _row_values(record)]}]
+
+
+def apply_changes(updates: list[tuple[int, dict]], delete_rows: list[int], appends: list[dict]):
+    """
+    Точечная правка таблицы: updates — (номер строки, запись), затем удаление строк
+    (снизу вверх, чтобы номера остальных не сдвигались), затем append в конец.
+    План привязан к номерам строк, поэтому после сбоя не повторяется — его надо построить заново.
+    """
+    with _lock:
+        sheet_id = _ensure_sheet_id()
+        requests = [{
+            "updateCells": {
+                "rows": _cells(record),
+                "fields": "userEnteredValue",
+                "range": {
+                    "sheetId": sheet_id,
+                    "startRowIndex": row - 1,
+                    "endRowIndex": row,
+                    "startColumnIndex": 0,
+                    "endColumnIndex": len(HEADER),
+                }
+            }
+        } for row, record in updates]
+        requests += [{
             "deleteDimension": {
                 "range": {
                     "sheetId": sheet_id,
                     "dimension": "ROWS",
-                    "startIndex": sheet_row - 1,
-                    "endIndex": sheet_row
+                    "startIndex": row - 1,
+                    "endIndex": row
                 }
             }
-        }]
-    }
-    _sheets.batchUpdate(
-        spreadsheetId=SPREADSHEET_ID,
-        body=body
-    ).execute()
+        } for row in sorted(set(delete_rows), reverse=True)]
+        requests += [{
+            "appendCells": {
+                "sheetId": sheet_id,
+                "rows": _cells(record),
+                "fields": "userEnteredValue"
+            }
+        } for record in appends]
+
+        try:
+            # запросы выполняются по порядку, в том числе между батчами
+            for i in range(0, len(requests), APPLY_CHUNK_SIZE):
+                _execute(_sheets.batchUpdate(
+                    spreadsheetId=SPREADSHEET_ID,
+                    body={"requests": requests[i:i + APPLY_CHUNK_SIZE]}
+                ), "batchUpdate", idempotent=False)
+        finally:
+            # часть батчей могла примениться и сдвинуть строки
+            _index.invalidate()
@@ -0,0 +1,197 @@
+import asyncio
+import itertools
+import json
+import sqlite3
+import uuid
+from contextlib import asynccontextmanager
+
+import config
+from config import logger
+from db.database_manager import RESYNC
+import sheets_client
+
+
+UPSERT = "upsert"
+DELETE = "delete"
+FLUSH_BATCH = 500
+MAX_BACKOFF = 300
+
+# одна строка на id: новая запись по тому же id заменяет старую.
+# sheet_ops_failed — операции, которые таблица отклонила, для ручного разбора
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sheet_ops (
+        key     TEXT PRIMARY KEY,
+        op      TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        seq     INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS sheet_ops_failed (
+        key       TEXT NOT NULL,
+        op        TEXT NOT NULL,
+        payload   TEXT NOT NULL,
+        seq       INTEGER NOT NULL,
+        error     TEXT NOT NULL,
+        failed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+
+class SheetsWriteQueue:
+    """
+    Write-behind queue for Google Sheets. Handlers enqueue upserts/deletes
+    into a local sqlite file and return at once; a background worker
+    coalesces them by record id and flushes them in batchUpdate calls on a
+    worker thread. Writes left in the file are flushed after a restart.
+    """
+
+    def __init__(self, path: str = config.SHEETS_QUEUE_PATH, delay: float = config.SHEETS_FLUSH_DELAY):
+        self.path = path
+        self.delay = delay
+        self._db: sqlite3.Connection | None = None
+        self._seq = None
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(SCHEMA)
+            last = self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM sheet_ops").fetchone()[0]
+            self._seq = itertools.count(last + 1)
+        return self._db
+
+    def _put(self, key: str, op: str, payload: dict):
+        db = self.db
+        with db:
+            db.execute("""
+                INSERT INTO sheet_ops (key, op, payload, seq) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET op = excluded.op, payload = excluded.payload, seq = excluded.seq
+            """, (key, op, json.dumps(payload, default=str), next(self._seq)))
+        self._wakeup.set()
+
+    def push_row(self, record: dict):
+        self.push_rows([record])
+
+    def push_rows(self, records: list[dict]):
+        for record in records:
+            # записи без id не склеиваются между собой
+            key = str(record["id"]) if record.get("id") else f"new:{uuid.uuid4().hex}"
+            payload = {k: record.get(k) for k in ("id", "name", "category", "geo", "status", "reason")}
+            self._put(key, UPSERT, payload)
+
+    def delete_row(self, record_id: int):
+        self._put(str(record_id), DELETE, {"id": int(record_id)})
+
+    def __len__(self) -> int:
+        return self.db.execute("SELECT COUNT(*) FROM sheet_ops").fetchone()[0]
+
+    async def flush(self) -> int:
+        """
+        Sends everything queued so far. Returns the number of applied operations.
+        """
+        async with self._flush_lock:
+            applied = 0
+            while True:
+                ops = self.db.execute(
+                    "SELECT key, op, payload, seq FROM sheet_ops ORDER BY seq LIMIT ?", (FLUSH_BATCH,)
+                ).fetchall()
+                if not ops:
+                    return applied
+                applied += await self._send(ops)
+
+    async def _send(self, ops: list[tuple]) -> int:
+        """
+        Sends ops in one batch. Only a rejection of the ops themselves (a 400
+        on one of the batch requests, a record that can't be written) splits
+        the batch in halves until the failing ops are found; those are moved
+        to sheet_ops_failed so they don't block the rest of the queue. Any
+        other error (network, quota, auth, missing sheet) is raised and the
+        whole batch stays queued for the next attempt.
+        """
+        deletes = [json.loads(payload)["id"] for _, op, payload, _ in ops if op == DELETE]
+        upserts = [json.loads(payload) for _, op, payload, _ in ops if op == UPSERT]
+        try:
+            # google api синхронный — уводим в поток, чтобы не блокировать event loop.
+            # удаления и записи уходят одним batchUpdate — один запрос из квоты
+            missing = await asyncio.to_thread(sheets_client.write_batch, deletes, upserts)
+        except Exception as e:
+            if not sheets_client.is_rejected(e):
+                raise
+            if len(ops) == 1:
+                self._dead_letter(ops[0], e)
+                return 0
+            middle = len(ops) // 2
+            return await self._send(ops[:middle]) + await self._send(ops[middle:])
+
+        if missing:
+            logger.warning(f"Sheets delete skipped, ids not found: {missing}")
+        db = self.db
+        with db:
+            # если за время отправки по id пришла новая запись, seq изменился и она останется в очереди
+            db.executemany(
+                "DELETE FROM sheet_ops WHERE key = ? AND seq = ?",
+                [(key, seq) for key, _, _, seq in ops],
+            )
+        return len(ops)
+
+    def _dead_letter(self, op: tuple, error: Exception):
+        key, kind, payload, seq = op
+        logger.error(f"Sheets {kind} of {key} rejected, moved to sheet_ops_failed: {payload}", exc_info=error)
+        db = self.db
+        with db:
+            db.execute(
+                "INSERT INTO sheet_ops_failed (key, op, payload, seq, error) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, payload, seq, repr(error)),
+            )
+            db.execute("DELETE FROM sheet_ops WHERE key = ? AND seq = ?", (key, seq))
+
+    async def apply_change(self, event: dict):
+        """
+        Change feed handler: a deleted celebrity (the webhook deletes rows
+        removed by hand) shifts sheet rows, so the row index is dropped.
+        """
+        if event["op"] in ("DELETE", RESYNC):
+            # индекс под threading-локом, который держит идущий flush — не блокируем event loop
+            await asyncio.to_thread(sheets_client.invalidate_row_index)
+
+    @asynccontextmanager
+    async def paused(self):
+        """
+        No flush runs inside the block (e.g. while the sheet is being rewritten).
+        """
+        async with self._flush_lock:
+            yield
+        self._wakeup.set()
+
+    async def run(self):
+        backoff = self.delay
+        if len(self):
+            self._wakeup.set()
+        while True:
+            await self._wakeup.wait()
+            # даём накопиться правкам одной и той же записи; у исчерпанной квоты
+            # ждём дольше — накопившееся уйдёт одним batchUpdate вместо нескольких
+            await asyncio.sleep(max(self.delay, sheets_client.QUOTA.wait_time()))
+            self._wakeup.clear()
+            try:
+                applied = await self.flush()
+            except Exception as e:
+                logger.error(f"Sheets flush failed, retry in {backoff}s", exc_info=e)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF)
+                self._wakeup.set()
+                continue
+            backoff = self.delay
+            if applied:
+                logger.info(f"Flushed {applied} sheet writes, Sheets API: {sheets_client.metrics()}")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+SHEETS_QUEUE = SheetsWriteQueue()
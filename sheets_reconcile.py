@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import sys
+
+import sheets_client
+from config import logger
+from sheets_queue import SHEETS_QUEUE
+
+REPORT_SAMPLE = 10
+
+
+def row_hash(values: list[str]) -> str:
+    """
+    md5 строки таблицы в том же виде, что ROW_HASHES считает в SQL.
+    Имя и гео в таблице с заглавных букв, в БД — строчными, поэтому сравниваем в lower().
+    """
+    rec_id, name, category, geo, status, reason = values
+    return hashlib.md5("\x1f".join([
+        rec_id, name.lower(), category.lower(), geo.lower(), status, reason
+    ]).encode()).hexdigest()
+
+
+async def build_plan(celebrity_service) -> dict:
+    """
+    Compares the sheet with Postgres row by row hash and returns the minimal
+    set of changes: rows to rewrite, rows to delete (ids missing in the DB
+    or repeated in the sheet) and records to append. Rows without a numeric
+    id are left alone and only counted.
+    """
+    db_hashes = await celebrity_service.get_row_hashes()
+    sheet_rows = await asyncio.to_thread(sheets_client.read_rows)
+
+    seen: dict[int, int] = {}
+    update_rows: dict[int, int] = {}
+    delete_rows, unknown_rows = [], []
+    for row, values in sheet_rows:
+        raw_id = values[0].strip()
+        if not raw_id.isdigit():
+            unknown_rows.append(row)
+            continue
+        rec_id = int(raw_id)
+        if rec_id not in db_hashes or rec_id in seen:
+            delete_rows.append(row)
+            continue
+        seen[rec_id] = row
+        if row_hash(values) != db_hashes[rec_id]:
+            update_rows[rec_id] = row
+
+    append_ids = sorted(rec_id for rec_id in db_hashes if rec_id not in seen)
+    records = await celebrity_service.get_by_ids(list(update_rows) + append_ids)
+    return {
+        "db_rows": len(db_hashes),
+        "sheet_rows": len(sheet_rows),
+        # строка могла удалиться из БД между запросами — такие пропускаем
+        "updates": [(row, records[rec_id]) for rec_id, row in update_rows.items() if rec_id in records],
+        "delete_rows": delete_rows,
+        "appends": [records[rec_id] for rec_id in append_ids if rec_id in records],
+        "unknown_rows": unknown_rows,
+    }
+
+
+def format_report(plan: dict) -> str:
+    lines = [
+        f"Строк в БД: {plan['db_rows']}, в таблице: {plan['sheet_rows']}",
+        f"Обновить: {len(plan['updates'])}",
+        f"Добавить: {len(plan['appends'])}",
+        f"Удалить: {len(plan['delete_rows'])}",
+    ]
+    if plan["unknown_rows"]:
+        lines.append(f"Строк без id (не трогаем): {len(plan['unknown_rows'])}")
+    if plan["updates"]:
+        lines.append("Расходятся: " + ", ".join(str(r["id"]) for _, r in plan["updates"][:REPORT_SAMPLE]))
+    if plan["appends"]:
+        lines.append("Нет в таблице: " + ", ".join(str(r["id"]) for r in plan["appends"][:REPORT_SAMPLE]))
+    if plan["delete_rows"]:
+        lines.append("Лишние строки: " + ", ".join(str(row) for row in plan["delete_rows"][:REPORT_SAMPLE]))
+    return "\n".join(lines)
+
+
+def has_changes(plan: dict) -> bool:
+    return bool(plan["updates"] or plan["appends"] or plan["delete_rows"])
+
+
+async def reconcile_sheet(celebrity_service, apply: bool = False) -> dict:
+    """
+    Dry run by default. With ``apply`` the plan is built and applied while
+    the sheet write queue is paused, so row numbers can't move in between.
+    """
+    if not apply:
+        return await build_plan(celebrity_service)
+    async with SHEETS_QUEUE.paused():
+        plan = await build_plan(celebrity_service)
+        if has_changes(plan):
+            await asyncio.to_thread(
+                sheets_client.apply_changes, plan["updates"], plan["delete_rows"], plan["appends"]
+            )
+            logger.info(f"Sheet reconciled: {len(plan['updates'])} updated, "
+                        f"{len(plan['appends'])} appended, {len(plan['delete_rows'])} deleted")
+    return plan
+
+
+async def main(apply: bool):
+    from db.database_manager import DatabaseManager
+    from db.celebrity_service import CelebrityService
+
+    pool = await DatabaseManager.get_pool()
+    try:
+        plan = await reconcile_sheet(CelebrityService(pool), apply=apply)
+        print(format_report(plan))
+    finally:
+        await DatabaseManager.close()
+
+
+if __name__ == "__main__":
+    # python sheets_reconcile.py [--apply]
+    asyncio.run(main("--apply" in sys.argv[1:]))
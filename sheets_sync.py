@@ -1,28 +1,42 @@
+import asyncio
 import os
+from datetime import timedelta
+from typing import Awaitable, Callable
+
 from dotenv import load_dotenv
 import psycopg2
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+
+
+EXPORT_CHUNK_SIZE = 1000
+SHEETS_WATERMARK = "sheets"
+# засечка синхронизации учитывает незавершённые транзакции (CelebrityService.sync_point),
+# но видит их только для сессий той же роли (без pg_read_all_stats). Запас покрывает
+# короткие транзакции других ролей (ручной SQL); транзакцию такой роли дольше запаса
+# выгрузка изменений пропустит — её подберёт полная выгрузка
+SYNC_OVERLAP = timedelta(seconds=int(os.getenv("SHEETS_SYNC_OVERLAP", 300)))
+
+# то же, что CelebrityService.sync_point, для CLI-выгрузки
+SYNC_POINT_SQL = """
+    SELECT least(clock_timestamp(), min(xact_start))
+      FROM pg_stat_activity
+     WHERE datname = current_database()
+       AND xact_start IS NOT NULL
+       AND pid <> pg_backend_pid()
+"""
+
 
 def export_postgres_to_sheets():
-    # 1) Загрузить .env
+    # 1) Загрузить .env — до импорта sheets_client, он читает настройки при импорте
     load_dotenv()
-    DATABASE_URL       = os.environ["DATABASE_URL"]
-    GOOGLE_SA_KEY_PATH = os.environ["GOOGLE_SA_KEY_PATH"]
-    SPREADSHEET_ID     = os.environ["SPREADSHEET_ID"]
-    SHEET_NAME         = os.getenv("SHEET_NAME", "celebrities")
-
-    # 2) Авторизация в Google Sheets API
-    SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-    creds = service_account.Credentials.from_service_account_file(
-        GOOGLE_SA_KEY_PATH, scopes=SCOPES
-    )
-    service = build("sheets", "v4", credentials=creds)
-    sheets  = service.spreadsheets()
+    DATABASE_URL = os.environ["DATABASE_URL"]
+    # 2) клиент Sheets с квотой и повторами при сбоях
+    import sheets_client
 
     # 3) Выгрузка из Postgres с id
     with psycopg2.connect(DATABASE_URL) as conn:
         with conn.cursor() as cur:
+            cur.execute(SYNC_POINT_SQL)
+            started = cur.fetchone()[0]
             cur.execute("""
                 SELECT id, name, category, geo, status, reason
                   FROM celebrities
@@ -30,37 +44,97 @@ def export_postgres_to_sheets():
             """)
             rows = cur.fetchall()
 
-    # 4) Формируем заголовок и данные
-    header = ["id", "name", "category", "geo", "status", "reason"]
-    rows_formatted = []
-    for (rid, name, cat, geo, status, reason) in rows:
-        rows_formatted.append([
-            rid,
-            name.title(),
-            cat,
-            geo.title(),
-            status,
-            reason or ""
-        ])
-    values = [header] + rows_formatted
-
-    # 5) Очищаем старые данные в A1:E
-    sheets.values().clear(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_NAME}!A1:E"
-    ).execute()
-
-    # 6) Записываем новые данные
-    sheets.values().update(
-        spreadsheetId=SPREADSHEET_ID,
-        range=f"{SHEET_NAME}!A1",
-        valueInputOption="RAW",
-        body={"values": values}
-    ).execute()
-
-    print(f"✅ Exported {len(rows)} rows (with id) to “{SHEET_NAME}” (A1:E).")
+    # 4) Заголовок и данные пачками по EXPORT_CHUNK_SIZE, затем очищаем строки ниже
+    fields = ("id", "name", "category", "geo", "status", "reason")
+    records = [dict(zip(fields, row)) for row in rows]
+    sheets_client.write_header()
+    for i in range(0, len(records), EXPORT_CHUNK_SIZE):
+        sheets_client.write_rows(i + 2, records[i:i + EXPORT_CHUNK_SIZE])
+    sheets_client.clear_from(len(records) + 2)
+
+    # полная выгрузка — точка отсчёта для следующей выгрузки изменений
+    with psycopg2.connect(DATABASE_URL) as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO sync_watermarks (name, synced_at) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET synced_at = EXCLUDED.synced_at
+            """, (SHEETS_WATERMARK, started))
+
+    print(f"✅ Exported {len(rows)} rows (with id) to “{sheets_client.SHEET_NAME}”.")
     return len(rows)
 
 
+async def export_celebrities_to_sheets(celebrity_service,
+                                       progress: Callable[[int, int], Awaitable] = None) -> int:
+    """
+    Full export for the running bot: rows are read from the pool chunk by
+    chunk and written over the sheet in batches of EXPORT_CHUNK_SIZE on a
+    worker thread, then the rows left below are cleared. ``progress(done, total)``
+    is awaited after every batch. Returns the number of exported rows.
+    """
+    # импорт здесь: sheets_client читает настройки при импорте, а CLI-выгрузка сначала грузит .env
+    import sheets_client
+    from sheets_queue import SHEETS_QUEUE
+
+    started = await celebrity_service.sync_point()
+    total = await celebrity_service.count_celebrities()
+    done = 0
+    # очередь записей ждёт: иначе она писала бы в строки, которые мы сейчас перезаписываем
+    async with SHEETS_QUEUE.paused():
+        try:
+            await asyncio.to_thread(sheets_client.write_header)
+            async for chunk in celebrity_service.iter_chunks(EXPORT_CHUNK_SIZE):
+                await asyncio.to_thread(sheets_client.write_rows, done + 2, chunk)
+                done += len(chunk)
+                if progress is not None:
+                    await progress(done, max(total, done))
+            await asyncio.to_thread(sheets_client.clear_from, done + 2)
+        finally:
+            # и после сбоя на середине строки уже переписаны — индекс недействителен
+            sheets_client.invalidate_row_index()
+    await _finish_sync(celebrity_service, started)
+    return done
+
+
+async def export_changes_to_sheets(celebrity_service,
+                                   progress: Callable[[int, int], Awaitable] = None) -> int:
+    """
+    Incremental export: pushes rows changed and deletes rows removed since
+    the last successful sync. Without a watermark falls back to the full
+    export. Returns the number of changed plus deleted rows.
+    """
+    import sheets_client
+    from sheets_queue import SHEETS_QUEUE
+
+    watermark = await celebrity_service.get_sync_watermark(SHEETS_WATERMARK)
+    if watermark is None:
+        return await export_celebrities_to_sheets(celebrity_service, progress)
+
+    started = await celebrity_service.sync_point()
+    since = watermark - SYNC_OVERLAP
+    deleted = await celebrity_service.get_deleted_since(since)
+    total = len(deleted) + await celebrity_service.count_changed(since)
+    done = 0
+    async with SHEETS_QUEUE.paused():
+        if deleted:
+            missing = await asyncio.to_thread(sheets_client.delete_rows_by_ids, deleted)
+            # уже удалённые из таблицы строки не ошибка: окно синхронизаций перекрывается
+            done += len(deleted) - len(missing)
+            if progress is not None:
+                await progress(done, max(total, done))
+        async for chunk in celebrity_service.iter_changed_chunks(since, EXPORT_CHUNK_SIZE):
+            await asyncio.to_thread(sheets_client.push_rows, chunk)
+            done += len(chunk)
+            if progress is not None:
+                await progress(done, max(total, done))
+    await _finish_sync(celebrity_service, started)
+    return done
+
+
+async def _finish_sync(celebrity_service, started):
+    await celebrity_service.set_sync_watermark(SHEETS_WATERMARK, started)
+    # более старые удаления следующей синхронизации уже не нужны
+    await celebrity_service.prune_deletions(started - SYNC_OVERLAP)
+
 if __name__ == "__main__":
     export_postgres_to_sheets()
@@ -30,4 +30,8 @@ class ModeratingStates(StatesGroup):
     awaiting_reason = State()
 
 class Upload(StatesGroup):
-    confirm = State()
\ No newline at end of file
+    confirm = State()
+
+class BulkModeration(StatesGroup):
+    selecting = State()
+    awaiting_reason = State()
@@ -11,6 +11,8 @@ from db.subscribers_service import SubscribersService
 async def is_moderator(user_id: int, subscribers_service: SubscribersService) -> bool:
     if user_id == config.ADMIN_ID:
         return True
+    if subscribers_service.roles_loaded:
+        return subscribers_service.has_role(user_id, "admin")
     role = await subscribers_service.get_user_role(user_id)
     return (role or "").lower() == "admin"
 
@@ -84,6 +86,8 @@ async def set_subscriber_username(chat_id: int , bot: Bot, subscribers_service:
 async def is_admin_or_moderator_or_observer(user_id: int, subscribers_service) -> bool:
     if user_id == config.ADMIN_ID:
         return True
+    if subscribers_service.roles_loaded:
+        return subscribers_service.has_role(user_id, "moderator", "observer")
     moderators = await subscribers_service.get_moderators()
     observers = await subscribers_service.get_observers()
     return user_id in moderators or user_id in observers